@@ -14,12 +14,21 @@ import os
 import re
 import sys
 import glob  # Added for wildcard expansion
+import hashlib
 import shutil # Added for backup functionality
+import stat
+import threading
 import warnings  # Added for warning capture
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Optional, Set, Tuple
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Set, Tuple, Union
+from urllib.parse import unquote  # Already loaded by mimetypes, so free to import here
 
-import requests
+import PIL
 from PIL import Image
 
 # Set up logging early so we can log any import issues.
@@ -32,29 +41,154 @@ def warning_to_logger(message, category, filename, lineno, file=None, line=None)
     """Send warnings to our logger with prefix format."""
     warning_message = f"{filename}:{lineno}: {category.__name__}: {message}"
     # If we're in the middle of processing a file, we'll add the prefix
-    current_file = getattr(warning_to_logger, 'current_file', None)
+    current_file = getattr(warning_to_logger.context, 'current_file', None)
     if current_file:
-        print(f"markdown_image_embedder error processing file: {os.path.basename(current_file)}", file=sys.stderr)
-    print(warning_message, file=sys.stderr)
+        print_to_stderr(f"markdown_image_embedder error processing file: {os.path.basename(current_file)}")
+    print_to_stderr(warning_message)
     logger.warning(warning_message)
 
-# Store the current file being processed in the warning handler
-warning_to_logger.current_file = None
+# Store the current file being processed in the warning handler; per thread,
+# since several files (and their images) are worked on concurrently.
+# log_buffer holds back that file's output while an earlier file is being written.
+warning_to_logger.context = threading.local()
+
+class FileLogBuffer:
+    """
+    Log records and stderr lines of one input file, held back until the main
+    loop reaches that file so concurrently processed files don't interleave.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = []
+        self.released = False
+
+    def hold(self, item) -> bool:
+        """Keep the item for later; False once released (emit it directly)."""
+        with self.lock:
+            if self.released:
+                return False
+            self.items.append(item)
+            return True
+
+    def release(self):
+        """Emit everything held so far, then let further output straight through."""
+        with self.lock:
+            for item in self.items:
+                if isinstance(item, str):
+                    print(item, file=sys.stderr)
+                else:
+                    logger.handle(item)
+            self.items = []
+            self.released = True
+
+def hold_file_output(item) -> bool:
+    """Hand the item to the current thread's file log buffer, if there is one."""
+    log_buffer = getattr(warning_to_logger.context, 'log_buffer', None)
+    return log_buffer is not None and log_buffer.hold(item)
+
+def print_to_stderr(text: str):
+    """Print to stderr, in order with the current file's log output."""
+    if not hold_file_output(text):
+        print(text, file=sys.stderr)
+
+class FileLogHoldFilter(logging.Filter):
+    """Divert records logged while processing a file into its FileLogBuffer."""
+    def filter(self, record):
+        return not hold_file_output(record)
+
+logger.addFilter(FileLogHoldFilter())
 
 # Redirect warnings to our custom handler
 warnings.showwarning = warning_to_logger
 
-# Try to import SVG support libraries.
+# Pillow-SIMD is a drop-in fork of Pillow (versioned like 9.5.0.post1) whose
+# resize and JPEG encode paths use SSE4/AVX2; nothing else changes when it is installed
+PILLOW_SIMD = ".post" in PIL.__version__
+
+# PyTurboJPEG is optional; when available, RGB images are encoded through the
+# libjpeg-turbo C API directly instead of PIL's save()
+try:
+    # turbojpeg first: when it is missing, NumPy is not worth importing either
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    import numpy as np
+    _turbo_jpeg = TurboJPEG()
+    TURBOJPEG_SUPPORT = True
+except Exception:  # ImportError, or the libturbojpeg shared library is missing
+    _turbo_jpeg = None
+    TURBOJPEG_SUPPORT = False
+
+# Use the SIMD-accelerated pybase64 encoder if it is installed.
 try:
-    from svglib.svglib import svg2rlg
-    from reportlab.graphics import renderPM
-    SVG_SUPPORT = True
+    from pybase64 import b64encode_as_string
 except ImportError:
-    SVG_SUPPORT = False
-    logger.warning("svglib and reportlab packages not installed. SVG files will be skipped. Install with: pip install svglib reportlab")
+    def b64encode_as_string(data: bytes) -> str:
+        """Base64-encode data and return the result as an ASCII string."""
+        return base64.b64encode(data).decode('ascii')
 
 # Constants
 MARKDOWN_IMAGE_OVERHEAD = 100  # Base64 data URL overhead in bytes
+VIDEO_SIGNATURE_BYTES = 12  # Leading bytes inspected by is_video_file
+VIDEO_HEADERS = frozenset((b'\x00\x00\x01\xBA', b'\x1A\x45\xDF\xA3'))  # MPEG program stream, Matroska/WebM
+FILE_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+# MIME types for common image extensions, checked before falling back to mimetypes
+IMAGE_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+}
+# Upper bounds (inclusive) of the file size rows in JPEG_QUALITY_TABLE
+JPEG_SIZE_THRESHOLDS = (1 * 1024, 5 * 1024, 20 * 1024, 50 * 1024, 100 * 1024, 200 * 1024)
+JPEG_QUALITY_LEVELS = 9  # Columns per row, one per quality scale setting
+# JPEG quality by size row and quality scale, flattened row by row
+JPEG_QUALITY_TABLE = (
+    100, 100, 100, 100, 100, 100, 100, 100, 100,
+    30, 45, 60, 75, 90, 92, 94, 96, 98,
+    25, 37, 49, 60, 70, 77, 83, 89, 95,
+    20, 28, 36, 43, 50, 60, 70, 80, 90,
+    15, 22, 28, 34, 40, 52, 63, 74, 85,
+    12, 16, 19, 22, 25, 40, 53, 67, 80,
+    10, 12, 14, 16, 18, 33, 47, 61, 75,
+)
+EMBEDDED_IMAGE_PREFIXES = ("data:image/", "data:image%2F")  # Plain and URL-encoded data URL schemes
+REMOTE_URL_PREFIXES = ("http://", "https://")
+JPEG_SIGNATURE = b'\xff\xd8\xff'  # JPEG start-of-image marker plus the next marker's prefix
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+MAX_SOURCE_SIZE_FACTOR = 10  # Images over this multiple of --max-size are skipped without decoding (or downloading), unless resized
+MAX_IMAGE_WORKERS = 8  # Images downloaded/compressed concurrently per document
+MAX_FILE_WORKERS = 4  # Input files read and processed concurrently, ahead of writing their output
+HTTP_TIMEOUT = (5, 30)  # Seconds to connect, and to wait for data once connected
+
+# Precompiled patterns used for every document / image match
+# All three image syntaxes in one alternation, so a document is scanned once:
+# ![[path|optional stuff]], ![alt](url) and ![alt][ref]
+IMAGE_LINK_PATTERN = re.compile(
+    r'!\[\[(?P<obsidian_url>.*?)\]\]'
+    r'|!\[(?P<alt>[^\]]*)\](?:\((?P<url>[^)\n]+)\)|\[(?P<ref>[^\]]+)\])'
+)
+REFERENCE_DEFINITION_PATTERN = re.compile(r'^\[(?P<id>[^\]]+)\]:\s+(?P<url>\S+)', re.MULTILINE)  # [id]: url
+
+# Shared HTTP session so downloads reuse keep-alive connections (and TLS
+# handshakes) across images from the same host; created by get_http_session
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# Encoded images reused across matches and input files within a run, keyed by
+# source (absolute file path and size, URL, or content digest) plus compression settings.
+# Values are (base64_data, jpeg_quality, original_size, compressed_size, mime_type).
+IMAGE_CACHE: dict = {}
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Stop adding entries beyond this much base64 data
+_image_cache_bytes = 0
+_image_cache_lock = threading.Lock()
+# IMAGE_CACHE key -> [lock held while that source is encoded, threads using it];
+# an entry only exists while some thread is working on or waiting for that source
+_image_source_locks: dict = {}
+
+# Load the system MIME tables now rather than on the first unrecognized extension
+mimetypes.init()
 
 @dataclass
 class CommandLineOptions:
@@ -74,11 +208,10 @@ class CommandLineOptions:
     max_file_size_mb: int = 10  # Maximum size for embedded files in MB
     max_width: Optional[int] = None  # Maximum width for images in pixels
     max_height: Optional[int] = None  # Maximum height for images in pixels
-    current_file: Optional[str] = None  # Current file being processed (for error context)
+    fast: bool = False  # Skip the Huffman optimization pass: faster encoding, larger JPEGs
 
-@dataclass
-class ImageMatch:
-    """Represents a matched image in markdown."""
+class ImageMatch(NamedTuple):
+    """Represents a matched image in markdown (a tuple, so no per-instance __dict__)."""
     original_text: str  # Original markdown text
     alt_text: str       # Alt text for the image
     url: str            # URL or file path to the image
@@ -101,8 +234,8 @@ class LogFilter(logging.Filter):
 
 def configure_logging(options: CommandLineOptions):
     """Configure logging based on command line options."""
-    # Always set base logger level to DEBUG to allow all messages to reach all handlers
-    # Individual handlers will filter based on their own levels
+    # Start at DEBUG so every handler is set up with all messages available;
+    # once the handler levels are known the logger is raised to the lowest of them
     logger.setLevel(logging.DEBUG)
     
     # Clear existing handlers to avoid duplication
@@ -172,6 +305,10 @@ def configure_logging(options: CommandLineOptions):
 
     logger.addHandler(console_handler)
     
+    # Messages no handler would emit are then dropped by the logger's level check,
+    # before a LogRecord is built and passed through every handler
+    logger.setLevel(min(handler.level for handler in logger.handlers))
+    
     # Ensure logger propagation is disabled to prevent duplicates
     logger.propagate = False
 
@@ -246,6 +383,10 @@ def parse_arguments() -> CommandLineOptions:
         "--max-height", "-H", type=int,
         help="Maximum height for images in pixels. Images will be scaled down to fit if necessary."
     )
+    parser.add_argument(
+        "--fast", "-f", action="store_true",
+        help="Skip Huffman table optimization: faster JPEG encoding, but noticeably larger output at low qualities"
+    )
     parser.add_argument(
         "--path", "-p", type=str, default="",
         help="Base path for resolving relative file paths (defaults to CWD if multiple/wildcard inputs, else input file's directory)"
@@ -362,6 +503,9 @@ def parse_arguments() -> CommandLineOptions:
          # If -p is provided, always use it and make it absolute
          base_path = os.path.abspath(base_path)
          logger.debug(f"Using specified base path: {base_path}")
+    # Strip trailing separators and stray quotes (e.g. from a quoted Windows path) once
+    # here instead of on every resolve_file_path call
+    base_path = base_path.rstrip('/\\"\' \t\r\n')
 
     # --- Populate Options Dataclass --- 
     options = CommandLineOptions(
@@ -379,7 +523,7 @@ def parse_arguments() -> CommandLineOptions:
         max_file_size_mb=args.max_size,
         max_width=args.max_width,
         max_height=args.max_height,
-        current_file=None  # Initialize to None, will be set during processing
+        fast=args.fast
     )
 
     return options
@@ -388,14 +532,13 @@ def format_file_size(size_bytes: int) -> str:
     """
     Format a file size in human-readable form.
     """
-    units = ["B", "KB", "MB", "GB", "TB"]
     if size_bytes == 0:
         return "0 B"
-    unit_index = 0
-    while size_bytes >= 1024 and unit_index < len(units) - 1:
-        size_bytes /= 1024.0
-        unit_index += 1
-    return f"{size_bytes:.1f} {units[unit_index]}"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    # Each unit is 2**10 times the previous one, so the bit length picks it directly
+    unit_index = min((int(size_bytes).bit_length() - 1) // 10, len(FILE_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * unit_index)):.1f} {FILE_SIZE_UNITS[unit_index]}"
 
 def get_mime_type(url: str) -> str:
     """
@@ -404,20 +547,32 @@ def get_mime_type(url: str) -> str:
     _, ext = os.path.splitext(url)
     if not ext:
         return "image/jpeg"
-    ext = ext.lower()
-    if ext in ['.jpg', '.jpeg']:
+    return mime_type_for_extension(ext.lower())
+
+def get_mime_type_from_data(data: bytes) -> Optional[str]:
+    """
+    Determine the MIME type from the leading signature bytes of image data.
+    Returns None if the format is not recognized.
+    """
+    if data.startswith(JPEG_SIGNATURE):
         return "image/jpeg"
-    elif ext == '.png':
+    if data.startswith(PNG_SIGNATURE):
         return "image/png"
-    elif ext == '.gif':
+    if data.startswith((b'GIF87a', b'GIF89a')):
         return "image/gif"
-    elif ext == '.bmp':
-        return "image/bmp"
-    elif ext == '.webp':
+    if data.startswith(b'RIFF') and data.startswith(b'WEBP', 8):
         return "image/webp"
-    elif ext == '.svg':
-        return "image/svg+xml"
-    mime_type, _ = mimetypes.guess_type(url)
+    return None
+
+@lru_cache(maxsize=32)
+def mime_type_for_extension(ext: str) -> str:
+    """
+    Map a lowercase file extension to an image MIME type, defaulting to image/jpeg.
+    """
+    mime_type = IMAGE_MIME_TYPES.get(ext)
+    if mime_type:
+        return mime_type
+    mime_type, _ = mimetypes.guess_type("image" + ext)
     if mime_type and mime_type.startswith('image/'):
         return mime_type
     return "image/jpeg"
@@ -426,73 +581,102 @@ def is_video_file(data: bytes) -> bool:
     """
     Check if the file data appears to be a video.
     """
-    if len(data) < 12:
+    if len(data) < VIDEO_SIGNATURE_BYTES:
         return False
-    if data[0:4] == b'\x00\x00\x01\xBA':
-        return True
-    if data[0:4] == b'\x1A\x45\xDF\xA3':
-        return True
-    if data[4:8] == b'ftyp':
+    # startswith with an offset compares in place instead of slicing out a copy
+    head = data[:4]
+    if head in VIDEO_HEADERS:
         return True
-    if data[0:4] == b'RIFF' and data[8:12] == b'AVI ':
+    if data.startswith(b'ftyp', 4):
         return True
-    if data[0:3] == b'FLV':
+    if head == b'RIFF' and data.startswith(b'AVI ', 8):
         return True
-    return False
+    return data.startswith(b'FLV')
 
 def calculate_jpeg_quality(file_size_bytes: int, quality_scale: int) -> int:
     """
     Calculate the JPEG quality level based on file size and quality scale.
     """
-    SIZE_1KB = 1 * 1024
-    SIZE_5KB = 5 * 1024
-    SIZE_20KB = 20 * 1024
-    SIZE_50KB = 50 * 1024
-    SIZE_100KB = 100 * 1024
-    SIZE_200KB = 200 * 1024
-    quality_table = [
-        [100, 100, 100, 100, 100, 100, 100, 100, 100],
-        [30, 45, 60, 75, 90, 92, 94, 96, 98],
-        [25, 37, 49, 60, 70, 77, 83, 89, 95],
-        [20, 28, 36, 43, 50, 60, 70, 80, 90],
-        [15, 22, 28, 34, 40, 52, 63, 74, 85],
-        [12, 16, 19, 22, 25, 40, 53, 67, 80],
-        [10, 12, 14, 16, 18, 33, 47, 61, 75]
-    ]
-    if file_size_bytes <= SIZE_1KB:
-        row_index = 0
-    elif file_size_bytes <= SIZE_5KB:
-        row_index = 1
-    elif file_size_bytes <= SIZE_20KB:
-        row_index = 2
-    elif file_size_bytes <= SIZE_50KB:
-        row_index = 3
-    elif file_size_bytes <= SIZE_100KB:
-        row_index = 4
-    elif file_size_bytes <= SIZE_200KB:
-        row_index = 5
-    else:
-        row_index = 6
-    quality_scale_index = quality_scale - 1
-    return quality_table[row_index][quality_scale_index]
+    # bisect_left keeps each threshold inclusive (a file of exactly 1 KB is in the first row)
+    row_index = bisect_left(JPEG_SIZE_THRESHOLDS, file_size_bytes)
+    return JPEG_QUALITY_TABLE[row_index * JPEG_QUALITY_LEVELS + quality_scale - 1]
 
-def compress_to_jpeg(input_data: bytes, quality_scale: int, url: str = "", max_width: Optional[int] = None, max_height: Optional[int] = None) -> Tuple[Optional[bytes], int, int, int]:
+def encode_jpeg_turbo(img: Image.Image, jpeg_quality: int) -> Optional[bytes]:
+    """
+    Encode an RGB image with libjpeg-turbo through PyTurboJPEG.
+    PyTurboJPEG has no Huffman optimization flag, so this is only used for --fast.
+    Returns None if the encode fails, so the caller can fall back to PIL.
+    """
+    try:
+        return _turbo_jpeg.encode(
+            np.asarray(img),
+            quality=jpeg_quality,
+            pixel_format=TJPF_RGB,
+            jpeg_subsample=TJSAMP_420,  # PIL's default chroma subsampling
+        )
+    except Exception as e:
+        logger.debug(f"turbojpeg encode failed, falling back to PIL: {e}")
+        return None
+
+def compress_to_jpeg(input_data: Union[bytes, str], quality_scale: int, url: str = "", max_width: Optional[int] = None, max_height: Optional[int] = None, file_size: Optional[int] = None, fast: bool = False) -> Tuple[Optional[bytes], int, int, int]:
     """
     Compress image data to JPEG format.
+    input_data is either the image bytes or the path of a local image file;
+    a path is handed straight to the decoder instead of being read into memory first.
+    file_size, when known from an earlier stat of the path, saves stat'ing it again.
+    fast skips the Huffman optimization pass (and allows the libjpeg-turbo encoder), trading size for speed.
     """
-    original_size = len(input_data)
+    input_path = input_data if isinstance(input_data, str) else None
+    try:
+        if not input_path:
+            original_size = len(input_data)
+        elif file_size is not None:
+            original_size = file_size
+        else:
+            original_size = os.path.getsize(input_path)
+    except OSError as e:
+        logger.error(f"Error reading local file: {input_path} - {e}")
+        return None, 0, 0, 0
     jpeg_quality = calculate_jpeg_quality(original_size, quality_scale)
     
-    if jpeg_quality == 100 and original_size <= 1024 and not max_width and not max_height:
-        logger.debug(f"Small image ({original_size} bytes): no compression needed")
-        return input_data, jpeg_quality, original_size, original_size
+    try:
+        skip_reason = ""
+        if not max_width and not max_height:
+            if jpeg_quality == 100 and original_size <= 1024:
+                skip_reason = f"Small image ({original_size} bytes): no compression needed"
+            elif jpeg_quality >= 90:
+                # A JPEG this small gains nothing from a near-lossless re-encode,
+                # so skip the whole decode/encode round trip
+                if input_path:
+                    with open(input_path, "rb") as f:
+                        header = f.read(len(JPEG_SIGNATURE))
+                else:
+                    header = input_data[:len(JPEG_SIGNATURE)]
+                if header == JPEG_SIGNATURE:
+                    skip_reason = f"Already a small JPEG ({original_size} bytes): no recompression needed"
+        if skip_reason:
+            if input_path:
+                with open(input_path, "rb") as f:
+                    input_data = f.read()
+            # Returned without decoding, so a (tiny) video would not be caught below
+            if is_video_file(input_data):
+                logger.info(f"Skipping video file: {url}")
+                return None, 0, original_size, 0
+            logger.debug(skip_reason)
+            return input_data, jpeg_quality, original_size, original_size
+    except OSError as e:
+        logger.error(f"Error reading local file: {input_path} - {e}")
+        return None, 0, original_size, 0
         
     try:
+        source = input_path or io.BytesIO(input_data)
         if url.lower().endswith('.svg'):
-            if not SVG_SUPPORT:
+            svg_renderer = load_svg_renderer()
+            if not svg_renderer:
                 logger.error("SVG support not available. Please install svglib and reportlab: pip install svglib reportlab")
                 return None, 0, original_size, 0
-            drawing = svg2rlg(io.BytesIO(input_data))
+            svg2rlg, renderPM = svg_renderer
+            drawing = svg2rlg(source)
             if not drawing:
                 logger.error(f"Failed to convert SVG to drawing: {url}")
                 return None, 0, original_size, 0
@@ -500,7 +684,7 @@ def compress_to_jpeg(input_data: bytes, quality_scale: int, url: str = "", max_w
             png_data = renderPM.drawToString(drawing, fmt="PNG")
             img = Image.open(io.BytesIO(png_data))
         else:
-            img = Image.open(io.BytesIO(input_data))
+            img = Image.open(source)
         
         # Resize image if max dimensions are specified
         if max_width or max_height:
@@ -525,47 +709,133 @@ def compress_to_jpeg(input_data: bytes, quality_scale: int, url: str = "", max_w
                 new_width = int(original_width * scale_factor)
                 new_height = int(original_height * scale_factor)
                 logger.debug(f"Resizing image from {original_width}x{original_height} to {new_width}x{new_height}")
-                img = img.resize((new_width, new_height), Image.LANCZOS)
+                # For JPEGs, let libjpeg decode at a reduced DCT scale (1/2, 1/4 or 1/8)
+                # that is still at least the target size; a no-op for other formats
+                img.draft(None, (new_width, new_height))
+                # reducing_gap box-reduces by an integer factor first (as thumbnail() does),
+                # leaving LANCZOS only the last step of at most 2x
+                img = img.resize((new_width, new_height), Image.LANCZOS, reducing_gap=2.0)
         
-        output_buffer = io.BytesIO()
-        
-        # Convert palette images (mode P) to RGB
-        if img.mode == 'P':
+        # Convert opaque palette images (mode P) to RGB
+        if img.mode == 'P' and 'transparency' not in img.info:
             img = img.convert('RGB')
-        # Handle images with transparency
+        # Handle images with transparency: composite onto white in a single pass
         elif img.mode in ('RGBA', 'LA') or 'transparency' in img.info:
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'RGBA':
-                background.paste(img, mask=img.split()[3])
-            else:
-                background.paste(img, mask=img.convert('RGBA').split()[3])
-            img = background
+            rgba = img if img.mode == 'RGBA' else img.convert('RGBA')
+            background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(background, rgba).convert('RGB')
         
-        img.save(output_buffer, format='JPEG', quality=jpeg_quality, optimize=True)
-        output_data = output_buffer.getvalue()
+        output_data = None
+        if fast and TURBOJPEG_SUPPORT and img.mode == 'RGB':
+            output_data = encode_jpeg_turbo(img, jpeg_quality)
+        if output_data is None:
+            output_buffer = io.BytesIO()
+            img.save(output_buffer, format='JPEG', quality=jpeg_quality, optimize=not fast)
+            output_data = output_buffer.getvalue()
         compressed_size = len(output_data)
         
         return output_data, jpeg_quality, original_size, compressed_size
         
     except Exception as e:
+        # Videos are only looked for once decoding has failed, so the common
+        # case never pays for the check (or, for local files, a second open)
+        try:
+            if input_path:
+                with open(input_path, "rb") as f:
+                    header = f.read(VIDEO_SIGNATURE_BYTES)
+            else:
+                header = input_data[:VIDEO_SIGNATURE_BYTES]
+        except OSError:
+            header = b""
+        if is_video_file(header):
+            logger.info(f"Skipping video file: {url}")
+            return None, 0, original_size, 0
         error_msg = f"Error compressing image: {e}"
         if url:
             error_msg += f" for URL: {url}"
         logger.error(error_msg)
         return None, 0, original_size, 0
 
-def download_image(url: str) -> Optional[bytes]:
+def get_http_session():
+    """
+    Return the shared requests.Session, creating it on first use.
+    requests is imported here so runs without remote images don't pay for it.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=16,
+                # Retry dropped connections and transient server errors with a short backoff;
+                # raise_on_status=False hands the last response back so its status gets logged
+                max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False),
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+    return _http_session
+
+@lru_cache(maxsize=None)
+def load_svg_renderer():
+    """
+    Import svglib and reportlab on first use.
+    Returns (svg2rlg, renderPM), or None if they are not installed.
+    """
+    try:
+        from svglib.svglib import svg2rlg
+        from reportlab.graphics import renderPM
+    except ImportError:
+        return None
+    return svg2rlg, renderPM
+
+def max_source_size(options: CommandLineOptions) -> Optional[int]:
+    """
+    Largest source image worth decoding or downloading, or None for no limit.
+    With --max-width/--max-height the source size says little about the output
+    (an uncompressed BMP shrinks far more than 10x once resized), so no limit applies.
+    """
+    if options.max_width or options.max_height:
+        return None
+    return options.max_file_size_mb * 1024 * 1024 * MAX_SOURCE_SIZE_FACTOR
+
+def download_image(url: str, max_bytes: Optional[int] = None) -> Optional[bytes]:
     """
     Download image data from a URL.
+    If max_bytes is given, a larger image is abandoned as soon as that is known
+    (from Content-Length, or while streaming) instead of being downloaded in full.
     """
     try:
+        import requests  # Deferred like the session itself; free once loaded
         logger.debug(f"Downloading from URL: {url}")
-        response = requests.get(url, timeout=30)
-        if response.status_code != 200:
-            logger.warning(f"Failed to download: {url} - Status code: {response.status_code}")
-            return None
-        logger.debug(f"Download successful: {url} - Size: {len(response.content)} bytes")
-        return response.content
+        session = get_http_session()
+        with session.get(url, timeout=HTTP_TIMEOUT, stream=True) as response:
+            if response.status_code != 200:
+                logger.warning(f"Failed to download: {url} - Status code: {response.status_code}")
+                return None
+            content_length = response.headers.get("Content-Length", "")
+            if max_bytes and content_length.isdigit() and int(content_length) > max_bytes:
+                logger.debug(f"Remote image too large to embed: {url} ({format_file_size(int(content_length))}) > {format_file_size(max_bytes)}")
+                return None
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                received += len(chunk)
+                if max_bytes and received > max_bytes:
+                    logger.debug(f"Remote image too large to embed: {url} (over {format_file_size(max_bytes)})")
+                    return None
+        content = b"".join(chunks)
+        logger.debug(f"Download successful: {url} - Size: {len(content)} bytes")
+        return content
+    except ImportError as e:
+        # Checked first: requests isn't bound for the clause below if its import failed
+        logger.error(f"Cannot download {url}: {str(e)}")
+        return None
     except requests.RequestException as e:
         logger.error(f"Error downloading {url}: {str(e)}")
         return None
@@ -583,92 +853,137 @@ def find_image_links(markdown: str) -> List[ImageMatch]:
       - Obsidian-style images:    ![[url]] (with optional dimension info via a pipe)
     """
     matches: List[ImageMatch] = []
-
-    # --- Obsidian-style images: ![[path|optional stuff]] ---
-    obsidian_pattern = re.compile(r'!\[\[(?P<url>.*?)\]\]')
-    for m in obsidian_pattern.finditer(markdown):
+    # Every image syntax starts with "![", so documents without one need no regex scans
+    # (reference definitions only matter when a reference-style image uses them)
+    if "![" not in markdown:
+        return matches
+
+    # Reference definitions: [id]: url. Only collected once a reference-style
+    # image needs them, since a definition may appear anywhere in the document.
+    ref_defs: Optional[dict[str, str]] = None
+
+    # A single scan yields the matches already in document order. Like finditer,
+    # every match (skipped or not) resumes the scan at its end, so nothing inside
+    # an already-embedded or unresolved image is picked up as a separate image.
+    search = IMAGE_LINK_PATTERN.search
+    m = search(markdown)
+    while m:
         position = m.start()
         match_text = m.group(0)
-        url = m.group("url")
-        alt_text = ""
-        matches.append(ImageMatch(
-            match_text,
-            alt_text,
-            url,
-            position,
-            len(match_text),
-            ref_id=None,
-            style="obsidian",
-        ))
-
-    # --- Collect reference definitions: [id]: url ---
-    ref_defs: dict[str, str] = {}
-    ref_def_pattern = re.compile(r'^\[(?P<id>[^\]]+)\]:\s+(?P<url>\S+)', re.MULTILINE)
-    for m in ref_def_pattern.finditer(markdown):
-        ref_id = m.group("id")
-        ref_url = m.group("url").strip()
-        if ref_id and ref_url:
-            ref_defs[ref_id] = ref_url
-
-    # --- Standard inline images: ![alt](url) ---
-    # This intentionally does NOT cross line boundaries, which avoids
-    # accidentally treating complex constructs like:
-    #   [![][img-ref] **Text**](https://example.com/article)
-    # as a giant image whose "url" is the article page.
-    inline_pattern = re.compile(r'!\[(?P<alt>[^\]]*)\]\((?P<url>[^)\n]+)\)')
-    for m in inline_pattern.finditer(markdown):
-        url = m.group("url").strip()
-        if url.startswith("data:image"):
-            continue  # already embedded
-        alt_text = m.group("alt")
-        position = m.start()
-        match_text = m.group(0)
-        matches.append(ImageMatch(
-            match_text,
-            alt_text,
-            url,
-            position,
-            len(match_text),
-            ref_id=None,
-            style="inline",
-        ))
+        next_pos = m.end()
+
+        # --- Obsidian-style images: ![[path|optional stuff]] ---
+        obsidian_url = m.group("obsidian_url")
+        if obsidian_url is not None:
+            matches.append(ImageMatch(
+                match_text,
+                "",
+                obsidian_url,
+                position,
+                len(match_text),
+                ref_id=None,
+                style="obsidian",
+            ))
+            m = search(markdown, next_pos)
+            continue
 
-    # --- Reference-style images: ![alt][ref] ---
-    ref_image_pattern = re.compile(r'!\[(?P<alt>[^\]]*)\]\[(?P<ref>[^\]]+)\]')
-    for m in ref_image_pattern.finditer(markdown):
+        # --- Standard inline images: ![alt](url) ---
+        # This intentionally does NOT cross line boundaries, which avoids
+        # accidentally treating complex constructs like:
+        #   [![][img-ref] **Text**](https://example.com/article)
+        # as a giant image whose "url" is the article page.
         ref_id = m.group("ref")
+        if ref_id is None:
+            url = m.group("url").strip()
+            if url.startswith("data:image"):
+                m = search(markdown, next_pos)
+                continue  # already embedded
+            matches.append(ImageMatch(
+                match_text,
+                m.group("alt"),
+                url,
+                position,
+                len(match_text),
+                ref_id=None,
+                style="inline",
+            ))
+            m = search(markdown, next_pos)
+            continue
+
+        # --- Reference-style images: ![alt][ref] ---
+        if ref_defs is None:
+            ref_defs = {}
+            for d in REFERENCE_DEFINITION_PATTERN.finditer(markdown):
+                def_id = d.group("id")
+                def_url = d.group("url").strip()
+                if def_id and def_url:
+                    ref_defs[def_id] = def_url
         url = ref_defs.get(ref_id)
-        if not url:
-            continue  # unresolved reference, skip
-        url = url.strip()
-        if url.startswith("data:image"):
-            continue  # already embedded
-        alt_text = m.group("alt")
-        position = m.start()
-        match_text = m.group(0)
+        if not url or url.startswith("data:image"):
+            m = search(markdown, next_pos)
+            continue  # unresolved reference or already embedded, skip
         matches.append(ImageMatch(
             match_text,
-            alt_text,
+            m.group("alt"),
             url,
             position,
             len(match_text),
             ref_id=ref_id,
             style="reference",
         ))
+        m = search(markdown, next_pos)
 
-    # Return matches in document order
-    matches.sort(key=lambda m: m.position)
     return matches
 
-def embed_image_data(match: ImageMatch, options: CommandLineOptions, stats: dict) -> Optional[str]:
+def image_cache_key(source: tuple, options: CommandLineOptions) -> tuple:
+    """
+    Build an IMAGE_CACHE key from an image source and the options that affect its encoding.
+    """
+    return source + (options.quality_scale, options.max_width, options.max_height, options.fast)
+
+def cache_image(sources: List[tuple], options: CommandLineOptions, entry: Tuple[str, int, int, int, str]) -> None:
+    """
+    Store an encoded image under each of its source keys, within IMAGE_CACHE_MAX_BYTES.
+    """
+    global _image_cache_bytes
+    with _image_cache_lock:
+        if _image_cache_bytes + len(entry[0]) > IMAGE_CACHE_MAX_BYTES:
+            return
+        _image_cache_bytes += len(entry[0])
+        for source in sources:
+            IMAGE_CACHE[image_cache_key(source, options)] = entry
+
+@contextmanager
+def image_source_lock(source: tuple, options: CommandLineOptions):
+    """
+    Hold the lock serializing work on one image source. Matches and files being
+    processed concurrently that reference the same image wait for the first to encode
+    it, then use its IMAGE_CACHE entry instead of encoding it again. The lock is
+    dropped once no thread needs it, so a long batch doesn't keep one per source.
+    """
+    key = image_cache_key(source, options)
+    with _image_cache_lock:
+        entry = _image_source_locks.get(key)
+        if entry is None:
+            entry = _image_source_locks[key] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _image_cache_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _image_source_locks[key]
+
+def embed_image_data(match: ImageMatch, options: CommandLineOptions, stats: dict) -> Optional[Tuple[str, str]]:
     """
     Download/resolve, compress and base64‑encode image data for a single match.
-    Returns the full data URL string, or None if embedding should be skipped.
+    Returns (mime_type, base64_data), or None if embedding should be skipped.
+    The two are kept apart so the data URL is only assembled in the final output.
     """
     url = match.url
-    is_local_file = False
-    image_data = None
-    current_file = getattr(options, 'current_file', None)  # Get current file context if available
+    file_size = None  # Size of a local image, kept from the stat that located it
 
     logger.debug(f"Processing image for embedding: {url}")
 
@@ -680,74 +995,97 @@ def embed_image_data(match: ImageMatch, options: CommandLineOptions, stats: dict
         logger.debug("Image already embedded, skipping.")
         return None
 
-    if options.yarle_mode and not url.startswith(("http://", "https://")):
+    # Checked once here; resolving a local path below never turns it into a URL
+    is_remote = url.startswith(REMOTE_URL_PREFIXES)
+
+    def use_cached(entry: Tuple[str, int, int, int, str]) -> Tuple[str, str]:
+        base64_data, jpeg_quality, original_size, compressed_size, mime_type = entry
+        stats["total_image_size"] += original_size
+        stats["total_compressed_size"] += compressed_size
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                f"Embedding [{url}](JPEG quality {jpeg_quality}%, cached): "
+                f"{format_file_size(original_size)} -> {format_file_size(compressed_size)}"
+            )
+        return mime_type, base64_data
+
+    if options.yarle_mode and not is_remote:
         if "./_resources/" in url or ".resources/" in url:
             logger.debug(f"Handling Yarle resource path: {url}")
-            resolved_path = resolve_file_path(url, options.base_path)
+            resolved_path, file_size = resolve_file_path(url, options.base_path)
             if resolved_path:
                 url = resolved_path
                 logger.debug(f"Resolved to: {url}")
 
+    # Larger sources are skipped before decoding (local files) or mid-download (remote ones)
+    max_source_bytes = max_source_size(options)
+
     # Resolve local vs remote
-    if not url.startswith(("http://", "https://")):
-        is_local_file = True
-        if not os.path.isfile(url):
+    if not is_remote:
+        if file_size is None:
+            file_size = regular_file_size(url)
+        if file_size is None:
             logger.debug(f"File not found at exact path: {url}")
-            resolved_path = resolve_file_path(url, options.base_path)
+            resolved_path, file_size = resolve_file_path(url, options.base_path)
             if resolved_path:
                 url = resolved_path
                 logger.debug(f"Resolved to: {url}")
             else:
                 logger.debug(f"Failed to resolve local file: {url}")
                 # Try to create directory listing to help diagnose the issue
-                try:
-                    dir_path = os.path.dirname(url) or '.'
-                    if os.path.exists(dir_path):
-                        files = os.listdir(dir_path)
-                        logger.debug(
-                            f"Files in directory {dir_path}: "
-                            f"{files[:10]}{' and more...' if len(files) > 10 else ''}"
-                        )
-                except Exception as dir_err:
-                    logger.debug(f"Error listing directory: {dir_err}")
+                log_directory_sample(os.path.dirname(url) or '.')
                 
                 stats["non_embedded_resources"].add(url)
                 return None
-        try:
-            with open(url, "rb") as f:
-                image_data = f.read()
-        except Exception as e:
-            err_msg = f"Error reading local file: {url} - {e}"
-            if current_file:
-                log_error_with_prefix(err_msg, os.path.basename(current_file))
-            else:
-                logger.error(err_msg)
+        if max_source_bytes is not None and file_size > max_source_bytes:
+            # Even heavy JPEG compression would not bring this under the embed limit
+            logger.debug(
+                f"Local file too large to embed: {url} "
+                f"({format_file_size(file_size)}) > {format_file_size(max_source_bytes)}"
+            )
             stats["non_embedded_resources"].add(url)
             return None
+        # Keyed by absolute normalized path, so "img/a.png" and "notes/../img/a.png"
+        # (as referenced from notes in different folders) share one entry
+        cache_sources = [("file", os.path.abspath(url), file_size)]
     else:
-        image_data = download_image(url)
+        cache_sources = [("url", url)]
+
+    with image_source_lock(cache_sources[0], options):
+        cached = IMAGE_CACHE.get(image_cache_key(cache_sources[0], options))
+        if cached:
+            return use_cached(cached)
+        if not is_remote:
+            # compress_to_jpeg lets the decoder read the file from its path
+            return encode_image_data(url, url, file_size, cache_sources, options, stats)
+
+        image_data = download_image(url, max_source_bytes)
         if not image_data:
             logger.debug(f"Failed to download image: {url}")
             stats["non_embedded_resources"].add(url)
             return None
-
-    if is_video_file(image_data):
-        logger.info(f"Skipping video file: {url}")
-        stats["non_embedded_resources"].add(url)
-        return None
-
-    mime_type = get_mime_type(url)
-    if not mime_type:
-        logger.debug(f"Unsupported file type: {url}")
-        stats["non_embedded_resources"].add(url)
-        return None
-
+        # The same bytes may also be served from another URL
+        cache_sources.append(("data", hashlib.blake2b(image_data, digest_size=16).digest()))
+        cached = IMAGE_CACHE.get(image_cache_key(cache_sources[1], options))
+        if cached:
+            cache_image(cache_sources[:1], options, cached)
+            return use_cached(cached)
+        return encode_image_data(image_data, url, None, cache_sources, options, stats)
+
+def encode_image_data(image_data: Union[bytes, str], url: str, file_size: Optional[int], cache_sources: List[tuple], options: CommandLineOptions, stats: dict) -> Optional[Tuple[str, str]]:
+    """
+    Compress and base64-encode one image for embed_image_data, and cache the result
+    under each of its sources. image_data is the downloaded bytes or a local path.
+    Returns (mime_type, base64_data), or None if the image can't be embedded.
+    """
     compressed_data, jpeg_quality, original_size, compressed_size = compress_to_jpeg(
         image_data,
         options.quality_scale,
         url,
         options.max_width,
         options.max_height,
+        file_size=file_size,
+        fast=options.fast,
     )
     if not compressed_data:
         logger.debug(f"Image compression failed: {url}")
@@ -758,13 +1096,15 @@ def embed_image_data(match: ImageMatch, options: CommandLineOptions, stats: dict
     stats["total_compressed_size"] += compressed_size
 
     # Log detailed size info at INFO level (will go to file always, console if -v or -d)
-    logger.info(
-        f"Embedding [{url}](JPEG quality {jpeg_quality}%): "
-        f"{format_file_size(original_size)} -> {format_file_size(compressed_size)}"
-    )
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            f"Embedding [{url}](JPEG quality {jpeg_quality}%): "
+            f"{format_file_size(original_size)} -> {format_file_size(compressed_size)}"
+        )
 
-    base64_data = base64.b64encode(compressed_data).decode('ascii')
-    final_size = len(base64_data) + MARKDOWN_IMAGE_OVERHEAD
+    # The base64 length follows from the data length, so an image that is too
+    # large is rejected without encoding it first
+    final_size = 4 * ((len(compressed_data) + 2) // 3) + MARKDOWN_IMAGE_OVERHEAD
     max_file_size_bytes = options.max_file_size_mb * 1024 * 1024
     if final_size > max_file_size_bytes:
         logger.debug(
@@ -774,43 +1114,82 @@ def embed_image_data(match: ImageMatch, options: CommandLineOptions, stats: dict
         stats["non_embedded_resources"].add(url)
         return None
 
-    data_url = f"data:{mime_type};base64,{base64_data}"
-    return data_url
+    # Label the data by what it actually is (normally the re-encoded JPEG, or an
+    # unchanged small original); the extension is only a fallback
+    mime_type = get_mime_type_from_data(compressed_data) or get_mime_type(url)
+    base64_data = b64encode_as_string(compressed_data)
+    cache_image(cache_sources, options, (base64_data, jpeg_quality, original_size, compressed_size, mime_type))
+    return mime_type, base64_data
+
+def log_directory_sample(dir_path: str) -> None:
+    """
+    Debug-log the first few entries of a directory, to help diagnose a missing file.
+    Does nothing unless debug logging is enabled, and reads only as many entries
+    as it shows, so a missing image in a large resource folder stays cheap.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    try:
+        with os.scandir(dir_path) as entries:
+            files = [entry.name for _, entry in zip(range(10), entries)]
+            more = next(entries, None) is not None
+    except FileNotFoundError:
+        return
+    except Exception as dir_err:
+        logger.debug(f"Error listing directory: {dir_err}")
+        return
+    logger.debug(f"Files in directory {dir_path}: {files}{' and more...' if more else ''}")
+
+def regular_file_size(path: str) -> Optional[int]:
+    """
+    Return the size of path if it is a regular file, otherwise None.
+    Uses a single stat call, in place of os.path.isfile followed by os.path.getsize.
+    """
+    try:
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return st.st_size if stat.S_ISREG(st.st_mode) else None
 
-def resolve_file_path(path: str, base_path: str) -> str:
+@lru_cache(maxsize=8192)
+def resolve_file_path(path: str, base_path: str) -> Tuple[str, Optional[int]]:
     """
     Attempt to resolve a local file path.
+    Returns the resolved path and its size, or ("", None) if no file was found.
+    base_path is expected to be already normalized by parse_arguments.
+    Results are cached, so an image referenced from many notes is only looked up once per run.
     """
     clean_path = path.rstrip('/\\"\' \t\r\n')
     
     # URL decode the path to handle %20 and other encoded characters
-    try:
-        import urllib.parse
-        decoded_path = urllib.parse.unquote(clean_path)
+    decoded_path = unquote(clean_path)
+    if decoded_path != clean_path:
         logger.debug(f"URL decoded path: {clean_path} -> {decoded_path}")
         clean_path = decoded_path
-    except Exception as e:
-        logger.debug(f"Error decoding URL: {e}")
     
-    if os.path.isfile(clean_path):
-        return clean_path
+    file_size = regular_file_size(clean_path)
+    if file_size is not None:
+        return clean_path, file_size
+    # Joining an absolute path onto base_path just yields the same path again
+    if os.path.isabs(clean_path):
+        return "", None
         
     if base_path:
-        base_path = base_path.rstrip('/\\"\' \t\r\n')
         relative_path = clean_path
         if relative_path.startswith("./"):
             relative_path = relative_path[2:]
         full_path = os.path.join(base_path, relative_path)
-        if os.path.isfile(full_path):
-            return full_path
+        file_size = regular_file_size(full_path)
+        if file_size is not None:
+            return full_path, file_size
             
-    return ""
+    return "", None
 
 def is_embedded_image(url: str) -> bool:
     """
     Check if a URL is already an embedded image.
     """
-    return url.startswith("data:image/") or url.startswith("data:image%2F")
+    return url.startswith(EMBEDDED_IMAGE_PREFIXES)
 
 def split_on_unescaped_pipe(text: str) -> Tuple[str, Optional[str]]:
     """
@@ -818,12 +1197,14 @@ def split_on_unescaped_pipe(text: str) -> Tuple[str, Optional[str]]:
     
     Returns a tuple (before, after) where 'after' is None if no unescaped pipe is found.
     """
-    match = re.search(r'(?<!\\)\|', text)
-    if match:
-        pos = match.start()
-        return text[:pos], text[pos:]
-    else:
-        return text, None
+    # Plain str.find scan: most texts have no pipe (a single find), and an
+    # escaped pipe only needs the preceding character checked
+    pos = text.find('|')
+    while pos != -1:
+        if pos == 0 or text[pos - 1] != '\\':
+            return text[:pos], text[pos:]
+        pos = text.find('|', pos + 1)
+    return text, None
 
 def log_error_with_prefix(message, filename=None):
     """
@@ -846,9 +1227,8 @@ def process_image_match(match: ImageMatch, options: CommandLineOptions, stats: d
     Process a single image match and return the embedded markdown.
     """
     url = match.url
-    is_local_file = False
     image_data = None
-    current_file = getattr(options, 'current_file', None)  # Get current file context if available
+    file_size = None  # Size of a local image, kept from the stat that located it
 
     logger.debug(f"Processing image: {url}")
 
@@ -859,65 +1239,52 @@ def process_image_match(match: ImageMatch, options: CommandLineOptions, stats: d
         logger.debug("Preserving already embedded image.")
         return match.original_text
 
-    if options.yarle_mode and not url.startswith(("http://", "https://")):
+    # Checked once here; resolving a local path below never turns it into a URL
+    is_remote = url.startswith(REMOTE_URL_PREFIXES)
+
+    if options.yarle_mode and not is_remote:
         if "./_resources/" in url or ".resources/" in url:
             logger.debug(f"Handling Yarle resource path: {url}")
-            resolved_path = resolve_file_path(url, options.base_path)
+            resolved_path, file_size = resolve_file_path(url, options.base_path)
             if resolved_path:
                 url = resolved_path
                 logger.debug(f"Resolved to: {url}")
 
-    if not url.startswith(("http://", "https://")):
-        is_local_file = True
-        if not os.path.isfile(url):
+    max_source_bytes = max_source_size(options)
+    if not is_remote:
+        if file_size is None:
+            file_size = regular_file_size(url)
+        if file_size is None:
             logger.debug(f"File not found at exact path: {url}")
-            resolved_path = resolve_file_path(url, options.base_path)
+            resolved_path, file_size = resolve_file_path(url, options.base_path)
             if resolved_path:
                 url = resolved_path
                 logger.debug(f"Resolved to: {url}")
             else:
                 logger.debug(f"Failed to resolve local file: {url}")
                 # Try to create directory listing to help diagnose the issue
-                try:
-                    dir_path = os.path.dirname(url) or '.'
-                    if os.path.exists(dir_path):
-                        files = os.listdir(dir_path)
-                        logger.debug(f"Files in directory {dir_path}: {files[:10]}{' and more...' if len(files) > 10 else ''}")
-                except Exception as dir_err:
-                    logger.debug(f"Error listing directory: {dir_err}")
+                log_directory_sample(os.path.dirname(url) or '.')
                 
                 stats["non_embedded_resources"].add(url)
                 return match.original_text
-        try:
-            with open(url, "rb") as f:
-                image_data = f.read()
-        except Exception as e:
-            err_msg = f"Error reading local file: {url} - {e}"
-            if current_file:
-                log_error_with_prefix(err_msg, os.path.basename(current_file))
-            else:
-                logger.error(err_msg)
+        if max_source_bytes is not None and file_size > max_source_bytes:
+            # Even heavy JPEG compression would not bring this under the embed limit
+            logger.debug(
+                f"Local file too large to embed: {url} "
+                f"({format_file_size(file_size)}) > {format_file_size(max_source_bytes)}"
+            )
             stats["non_embedded_resources"].add(url)
             return match.original_text
+        # compress_to_jpeg lets the decoder read the file from its path
+        image_data = url
     else:
-        image_data = download_image(url)
+        image_data = download_image(url, max_source_bytes)
         if not image_data:
             logger.debug(f"Failed to download image: {url}")
             stats["non_embedded_resources"].add(url)
             return match.original_text
 
-    if is_video_file(image_data):
-        logger.info(f"Skipping video file: {url}")
-        stats["non_embedded_resources"].add(url)
-        return match.original_text
-
-    mime_type = get_mime_type(url)
-    if not mime_type:
-        logger.debug(f"Unsupported file type: {url}")
-        stats["non_embedded_resources"].add(url)
-        return match.original_text
-
-    compressed_data, jpeg_quality, original_size, compressed_size = compress_to_jpeg(image_data, options.quality_scale, url, options.max_width, options.max_height)
+    compressed_data, jpeg_quality, original_size, compressed_size = compress_to_jpeg(image_data, options.quality_scale, url, options.max_width, options.max_height, file_size=file_size, fast=options.fast)
     if not compressed_data:
         logger.debug(f"Image compression failed: {url}")
         stats["non_embedded_resources"].add(url)
@@ -927,12 +1294,14 @@ def process_image_match(match: ImageMatch, options: CommandLineOptions, stats: d
     stats["total_compressed_size"] += compressed_size
 
     # Log detailed size info at INFO level (will go to file always, console if -v or -d)
-    logger.info(
-        f"Embedding [{url}](JPEG quality {jpeg_quality}%): {format_file_size(original_size)} -> {format_file_size(compressed_size)}"
-    )
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            f"Embedding [{url}](JPEG quality {jpeg_quality}%): {format_file_size(original_size)} -> {format_file_size(compressed_size)}"
+        )
 
-    base64_data = base64.b64encode(compressed_data).decode('ascii')
-    final_size = len(base64_data) + MARKDOWN_IMAGE_OVERHEAD
+    # The base64 length follows from the data length, so an image that is too
+    # large is rejected without encoding it first
+    final_size = 4 * ((len(compressed_data) + 2) // 3) + MARKDOWN_IMAGE_OVERHEAD
     max_file_size_bytes = options.max_file_size_mb * 1024 * 1024
     if final_size > max_file_size_bytes:
         logger.debug(
@@ -941,6 +1310,10 @@ def process_image_match(match: ImageMatch, options: CommandLineOptions, stats: d
         stats["non_embedded_resources"].add(url)
         return match.original_text
 
+    # Label the data by what it actually is (normally the re-encoded JPEG, or an
+    # unchanged small original); the extension is only a fallback
+    mime_type = get_mime_type_from_data(compressed_data) or get_mime_type(url)
+    base64_data = b64encode_as_string(compressed_data)
     alt_text = match.alt_text
     alt_text, dimensions = split_on_unescaped_pipe(alt_text)
     alt_text = alt_text.replace('\\', '')
@@ -950,14 +1323,12 @@ def process_image_match(match: ImageMatch, options: CommandLineOptions, stats: d
     else:
         dimensions = ""
 
-    embedded_image = f"![{alt_text}{dimensions}](data:{mime_type};base64,{base64_data})"
-
     make_clickable = False
     link_target = ""
-    if not is_local_file and url.startswith(("http://", "https://")):
+    if is_remote:
         make_clickable = True
         link_target = url.replace('\\', '')
-    elif match.alt_text.startswith(("http://", "https://")):
+    elif match.alt_text.startswith(REMOTE_URL_PREFIXES):
         make_clickable = True
         link_target = match.alt_text.replace('\\', '')
 
@@ -966,7 +1337,17 @@ def process_image_match(match: ImageMatch, options: CommandLineOptions, stats: d
         link_target = link_target.replace('\\', '')
         return f"[![{alt_text}{dimensions}](data:{mime_type};base64,{base64_data})]({link_target})"
     else:
-        return embedded_image
+        # Only built here, so a clickable image doesn't also format an unused copy of the base64 text
+        return f"![{alt_text}{dimensions}](data:{mime_type};base64,{base64_data})"
+
+def image_match_key(match: ImageMatch) -> Tuple[str, str]:
+    """
+    Return the canonical key identifying the logical image behind a match.
+    Uses the reference label when available, otherwise the URL.
+    """
+    if match.style == "reference" and match.ref_id:
+        return ("ref", match.ref_id)
+    return ("url", match.url)
 
 def process_markdown(markdown: str, options: CommandLineOptions, current_file_path: Optional[str] = None) -> Tuple[str, dict]:
     """
@@ -978,16 +1359,26 @@ def process_markdown(markdown: str, options: CommandLineOptions, current_file_pa
     Returns:
         A tuple containing the processed markdown and a dictionary of statistics.
     """
+    output_parts, stats = process_markdown_parts(markdown, options, current_file_path)
+    return ''.join(output_parts), stats
+
+def process_markdown_parts(markdown: str, options: CommandLineOptions, current_file_path: Optional[str] = None) -> Tuple[List[str], dict]:
+    """
+    Process markdown text and embed images, returning the output as a list of string parts.
+    Writing the parts out directly (file.writelines) avoids joining the whole
+    document, base64 data included, into one more string.
+    Args:
+        markdown: The markdown content to process.
+        options: The command line options.
+        current_file_path: The path to the current file being processed (used for logging context).
+    Returns:
+        A tuple containing the processed markdown parts and a dictionary of statistics.
+    """
     original_markdown_size = len(markdown)
     # Use DEBUG level for context message, as it's not needed in normal verbose output
     file_context = f" for file: {current_file_path}" if current_file_path else " for stdin"
     logger.debug(f"Processing markdown{file_context}, original size: {original_markdown_size} bytes")
 
-    # Store current file path in options for error context
-    temp_options = options
-    if current_file_path:
-        temp_options.current_file = current_file_path
-
     stats = {
         "total_image_size": 0,
         "total_compressed_size": 0,
@@ -1003,44 +1394,57 @@ def process_markdown(markdown: str, options: CommandLineOptions, current_file_pa
 
     # --- First pass: generate unique embedded data URLs ---
     key_to_embedded_id: dict[Tuple[str, str], str] = {}
-    embedded_data_by_id: dict[str, str] = {}
+    embedded_data_by_id: dict[str, Tuple[str, str]] = {}
     img_counter = 1
 
-    for match in matches:
-        # Canonical key: reference label when available, otherwise URL
-        if getattr(match, "style", None) == "reference" and match.ref_id:
-            key = ("ref", match.ref_id)
-        else:
-            key = ("url", match.url)
-
-        if key in key_to_embedded_id:
-            # Already processed this logical image
-            continue
+    # Collect each logical image once, in document order; the keys are kept for the second pass
+    match_keys = [image_match_key(match) for match in matches]
+    unique_matches: dict[Tuple[str, str], ImageMatch] = {}
+    for key, match in zip(match_keys, matches):
+        unique_matches.setdefault(key, match)
+
+    # Download/compress the images concurrently. Each task records its stats
+    # separately so they can be merged below without locking, and logs into
+    # this file's buffer (if any) like the calling thread.
+    log_buffer = getattr(warning_to_logger.context, 'log_buffer', None)
+    def embed_with_stats(match: ImageMatch) -> Tuple[Optional[Tuple[str, str]], dict]:
+        warning_to_logger.context.current_file = current_file_path
+        warning_to_logger.context.log_buffer = log_buffer
+        image_stats = {
+            "total_image_size": 0,
+            "total_compressed_size": 0,
+            "non_embedded_resources": set()
+        }
+        return embed_image_data(match, options, image_stats), image_stats
+
+    if len(unique_matches) > 1:
+        with ThreadPoolExecutor(max_workers=MAX_IMAGE_WORKERS) as executor:
+            results = list(executor.map(embed_with_stats, unique_matches.values()))
+    else:
+        results = [embed_with_stats(match) for match in unique_matches.values()]
 
-        data_url = embed_image_data(match, temp_options, stats)
-        if not data_url:
+    for key, (image_data, image_stats) in zip(unique_matches, results):
+        stats["total_image_size"] += image_stats["total_image_size"]
+        stats["total_compressed_size"] += image_stats["total_compressed_size"]
+        stats["non_embedded_resources"].update(image_stats["non_embedded_resources"])
+        if not image_data:
             stats["skipped_images"] += 1
             continue
 
         embedded_id = f"mie-img-{img_counter}"
         img_counter += 1
         key_to_embedded_id[key] = embedded_id
-        embedded_data_by_id[embedded_id] = data_url
+        embedded_data_by_id[embedded_id] = image_data
         stats["images_processed"] += 1
 
     # --- Second pass: rebuild markdown body using reference IDs ---
     result_parts = []
     last_pos = 0
 
-    for match in matches:
+    for match, key in zip(matches, match_keys):
         if match.position > last_pos:
             result_parts.append(markdown[last_pos:match.position])
 
-        if getattr(match, "style", None) == "reference" and match.ref_id:
-            key = ("ref", match.ref_id)
-        else:
-            key = ("url", match.url)
-
         embedded_id = key_to_embedded_id.get(key)
         if not embedded_id:
             # No embedded data for this image; leave original intact
@@ -1068,14 +1472,14 @@ def process_markdown(markdown: str, options: CommandLineOptions, current_file_pa
 
     # --- Append embedded image reference definitions at the end ---
     if embedded_data_by_id:
-        # Ensure there's a blank line before our block
-        body = body.rstrip() + "\n\n"
-        body += "<!-- Embedded image data generated by markdown_image_embedder -->\n"
-        for embedded_id, data_url in embedded_data_by_id.items():
-            body += f"[{embedded_id}]: {data_url}\n"
-
-    output = body
-    stats["total_output_size"] = len(output)
+        # Ensure there's a blank line before our block. The base64 data goes
+        # into the list as its own part, so it is never copied into a larger string.
+        output_parts = [body.rstrip(), "\n\n", "<!-- Embedded image data generated by markdown_image_embedder -->\n"]
+        for embedded_id, (mime_type, base64_data) in embedded_data_by_id.items():
+            output_parts += ("[", embedded_id, "]: data:", mime_type, ";base64,", base64_data, "\n")
+    else:
+        output_parts = [body]
+    stats["total_output_size"] = sum(map(len, output_parts))
 
     total_original_size = original_markdown_size + stats["total_image_size"]
     final_size = stats["total_output_size"]
@@ -1095,7 +1499,30 @@ def process_markdown(markdown: str, options: CommandLineOptions, current_file_pa
     stats["input_md_size"] = original_markdown_size
     stats["output_md_size"] = final_size
 
-    return output, stats
+    return output_parts, stats
+
+def read_and_process_file(input_file: str, options: CommandLineOptions, log_buffer: FileLogBuffer) -> Tuple[int, List[str], dict]:
+    """
+    Read one input file and embed its images (run on the file worker threads).
+    Its log output goes to log_buffer until the main loop releases it.
+    Returns the input size, the processed markdown parts and the statistics.
+    """
+    # Set current file in the warning handler
+    warning_to_logger.context.current_file = input_file
+    warning_to_logger.context.log_buffer = log_buffer
+    try:
+        # Log start of file processing at INFO level (console if -v/-d, always in log file)
+        logger.info(f"--- Processing file: {input_file} ---")
+        # Log reading action at DEBUG level
+        logger.debug(f"Reading file: {input_file}")
+        with open(input_file, 'r', encoding='utf-8') as f:
+            input_markdown = f.read()
+        output_parts, stats = process_markdown_parts(input_markdown, options, current_file_path=input_file)
+        return len(input_markdown), output_parts, stats
+    finally:
+        # Reset the warning handler's current file
+        warning_to_logger.context.current_file = None
+        warning_to_logger.context.log_buffer = None
 
 def main() -> int:
     """Main entry point for the application."""
@@ -1103,6 +1530,11 @@ def main() -> int:
     
     # Configure logging just once, early in main
     configure_logging(options)
+    if not PILLOW_SIMD:
+        logger.debug(
+            f"Using stock Pillow {PIL.__version__}; for faster resizing and JPEG encoding: "
+            "pip uninstall pillow && pip install pillow-simd"
+        )
     
     # --- Initialization ---
     exit_code = 0
@@ -1144,7 +1576,7 @@ def main() -> int:
 
     # --- Processing Loop ---
     if files_to_process:
-        is_first_output_write = bool(options.output_file)
+        output_file_handle = None  # --output-file, opened on the first write and kept for the whole batch
         # Print header with clear description of what we're processing
         file_count = len(files_to_process)
         if file_count == 1:
@@ -1158,34 +1590,38 @@ def main() -> int:
             # For multiple files, use the original input pattern(s)
             print(f"markdown_image_embedder processing {file_count} files: {input_desc}", file=sys.stderr)
             
+        # Files are read and processed on worker threads, up to MAX_FILE_WORKERS ahead
+        # of the one being written, so a batch of notes with only an image or two each
+        # still overlaps their downloads and encodes. Output is written in order below.
+        file_executor = ThreadPoolExecutor(max_workers=MAX_FILE_WORKERS)
+        pending_files = deque()
+        next_file_index = 0
         for input_file in files_to_process:
+            while next_file_index < file_count and len(pending_files) < MAX_FILE_WORKERS:
+                log_buffer = FileLogBuffer()
+                pending_files.append((file_executor.submit(read_and_process_file, files_to_process[next_file_index], options, log_buffer), log_buffer))
+                next_file_index += 1
             # Store details for final summary
             file_detail = {"filename": input_file, "status": "ERROR", "message": "", 
                            "initial_size": 0, "final_size": 0}
-            # Set current file in the warning handler
-            warning_to_logger.current_file = input_file
-            # Log start of file processing at INFO level (console if -v/-d, always in log file)
-            logger.info(f"--- Processing file: {input_file} ---") 
             try:
-                # Log reading action at DEBUG level
-                logger.debug(f"Reading file: {input_file}")
-                with open(input_file, 'r', encoding='utf-8') as f:
-                    input_markdown = f.read()
-                file_detail["initial_size"] = len(input_markdown) # Store initial size
-
-                output_markdown, stats = process_markdown(input_markdown, options, current_file_path=input_file)
+                future, log_buffer = pending_files.popleft()
+                # Emit what this file logged while earlier files were being written;
+                # from here on its worker logs directly, still before anything below
+                log_buffer.release()
+                initial_size, output_parts, stats = future.result()
+                file_detail["initial_size"] = initial_size # Store initial size
                 overall_non_embedded.update(stats["non_embedded_resources"])
 
                 # Determine output action
                 if options.output_file:
                     # Aggregate all processed files into a single output file.
-                    # First file truncates/creates, subsequent files append.
+                    # The first write truncates/creates it; later files follow on the same handle.
                     logger.debug(f"Writing output to file: {options.output_file}") 
                     try:
-                        mode = 'w' if is_first_output_write else 'a'
-                        with open(options.output_file, mode, encoding='utf-8') as f:
-                            f.write(output_markdown)
-                        is_first_output_write = False
+                        if output_file_handle is None:
+                            output_file_handle = open(options.output_file, 'w', encoding='utf-8')
+                        output_file_handle.writelines(output_parts)
                         file_detail["status"] = "OK"
                         processed_files_count += 1
                     except Exception as e:
@@ -1200,7 +1636,7 @@ def main() -> int:
                     try:
                         shutil.copy2(input_file, backup_file)
                         with open(input_file, 'w', encoding='utf-8') as f:
-                            f.write(output_markdown)
+                            f.writelines(output_parts)
                         # Log overwrite action at DEBUG level
                         logger.debug(f"Overwrote original file: {input_file}") 
                         file_detail["status"] = "OK"
@@ -1215,7 +1651,7 @@ def main() -> int:
                     logger.debug(f"Overwriting original file: {input_file}") 
                     try:
                         with open(input_file, 'w', encoding='utf-8') as f:
-                            f.write(output_markdown)
+                            f.writelines(output_parts)
                         file_detail["status"] = "OK"
                         processed_files_count += 1
                     except Exception as e:
@@ -1228,7 +1664,7 @@ def main() -> int:
                     # Use logger.debug here as markdown is going to stdout
                     logger.debug("Writing output to stdout") 
                     # --- CRITICAL: Write ONLY markdown to stdout --- 
-                    sys.stdout.write(output_markdown)
+                    sys.stdout.writelines(output_parts)
                     sys.stdout.flush()
                     # --- END CRITICAL SECTION --- 
                     file_detail["status"] = "OK"
@@ -1246,29 +1682,32 @@ def main() -> int:
                 if options.debug:
                     logger.exception(f"Stack trace for {input_file}:", exc_info=True)
 
-            finally:
-                # Reset the warning handler's current file
-                warning_to_logger.current_file = None
-
             # Store results for this file
             processed_file_details.append(file_detail)
             if file_detail["status"] == "OK":
                  overall_success_count += 1
             else:
                  overall_error_count += 1
+        file_executor.shutdown()
+        if output_file_handle is not None:
+            try:
+                output_file_handle.close()
+            except Exception as e:
+                log_error_with_prefix(f"Failed to write output file {options.output_file}: {e}")
+                exit_code = 1
 
     else: # Process stdin
         stdin_detail = {"filename": "stdin", "status": "ERROR", "message": "",
                         "initial_size": 0, "final_size": 0}
         # Set current file in warning handler for stdin
-        warning_to_logger.current_file = "stdin"
+        warning_to_logger.context.current_file = "stdin"
         try:
             # Log stdin actions at INFO level (always in log file, console only if -v/-d)
             logger.info("Reading markdown from stdin...") 
             input_markdown = sys.stdin.read()
             stdin_detail["initial_size"] = len(input_markdown)
             logger.info("Processing markdown from stdin...") 
-            output_markdown, stats = process_markdown(input_markdown, options, current_file_path="stdin")
+            output_parts, stats = process_markdown_parts(input_markdown, options, current_file_path="stdin")
             overall_non_embedded.update(stats["non_embedded_resources"])
             stdin_detail["status"] = "OK"
             processed_files_count += 1
@@ -1279,7 +1718,7 @@ def main() -> int:
                  logger.debug(f"Writing output to file: {options.output_file}") 
                  try:
                      with open(options.output_file, 'w', encoding='utf-8') as f:
-                         f.write(output_markdown)
+                         f.writelines(output_parts)
                      stdin_detail["status"] = "OK"
                      processed_files_count += 1
                  except Exception as e:
@@ -1292,7 +1731,7 @@ def main() -> int:
                 # Use logger.debug here as markdown is going to stdout
                 logger.debug("Writing output to stdout") 
                 # --- CRITICAL: Write ONLY markdown to stdout --- 
-                sys.stdout.write(output_markdown)
+                sys.stdout.writelines(output_parts)
                 sys.stdout.flush()
                 # --- END CRITICAL SECTION --- 
                 stdin_detail["status"] = "OK"
@@ -1312,7 +1751,7 @@ def main() -> int:
 
         finally:
             # Reset the warning handler's current file
-            warning_to_logger.current_file = None
+            warning_to_logger.context.current_file = None
 
         # Store results for stdin
         processed_file_details.append(stdin_detail)
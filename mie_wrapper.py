@@ -11,20 +11,35 @@ Markdown‑Image‑Embedder wrapper
 
 from __future__ import annotations
 import argparse, glob, os, shutil, subprocess, sys, tempfile, textwrap
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import time
-from typing import List
+from typing import List, Optional, TextIO, Tuple
 
 # ────────────────────────────────────────────────  constants
 EMBEDDER = Path(r"E:\source\mine\MarkdownImageEmbedder\markdown_image_embedder.py")
 PIPE_TO_CODE = Path(r"C:\utils\winutils\pipe-to-code.bat")      # ← existing helper
 CONDA_ENV = "mypython312"
 
+# Same for every file in the batch
+EMBEDDER_PREFIX = (
+    sys.executable, str(EMBEDDER),
+    "--quiet",          # silence embedder console
+    "--verbose",        # …but write INFO+ to log file
+)
+
 # ────────────────────────────────────────────────  helpers
 def fail(msg: str, code: int = 1) -> None:
     print(f"ERROR: {msg}", file=sys.stderr)
     sys.exit(code)
 
+def log_text(text: str) -> bytes:
+    """
+    Encode the wrapper's own master-log text the way a text-mode file would
+    (os.linesep line endings), matching the per-file logs copied in as bytes.
+    """
+    return text.replace("\n", os.linesep).encode("utf-8")
+
 def good_env() -> bool:
     return os.environ.get("CONDA_DEFAULT_ENV") == CONDA_ENV
 
@@ -33,15 +48,13 @@ def run_embedder(
     outfile: Path,
     args_from_cli: argparse.Namespace,
     log: Path,
-) -> bool:
-    """Return True on success."""
+) -> Tuple[bool, str]:
+    """Return (True on success, the embedder's captured stderr)."""
     cmd: List[str] = [
-        sys.executable, str(EMBEDDER),
+        *EMBEDDER_PREFIX,
         "--input-file", str(infile),
         "--output-file", str(outfile),
         "--log-file", str(log),
-        "--quiet",          # silence embedder console
-        "--verbose",        # …but write INFO+ to log file
     ]
     # user‑controlled extras
     if args_from_cli.debug:
@@ -57,8 +70,62 @@ def run_embedder(
     if args_from_cli.max_height:
         cmd += ["--max-height", str(args_from_cli.max_height)]
 
-    proc = subprocess.run(cmd, text=True)
-    return proc.returncode == 0
+    # stderr is captured so that, with several files running at once, each
+    # file's messages are printed together rather than interleaved
+    proc = subprocess.run(cmd, text=True, stderr=subprocess.PIPE)
+    return proc.returncode == 0, proc.stderr
+
+# Console output of one file, as (stream, text) pairs, printed once its turn comes
+ConsoleLines = List[Tuple[TextIO, str]]
+
+def process_one(f: Path, args_from_cli: argparse.Namespace) -> Tuple[Optional[bool], Optional[Path], ConsoleLines]:
+    """
+    Run the embedder on one file (f → temp file next to it). On success the original
+    is renamed to .bak and the temp file takes its place; on failure f is untouched.
+    Returns (success, per-file log, console output); the first two are None if the
+    file was skipped. Nothing is printed here, so main() can keep files in order.
+    """
+    console: ConsoleLines = []
+    if not f.exists():
+        console.append((sys.stdout, f"Skip missing file: {f}\n"))
+        return None, None, console
+
+    # Same directory as f, so both renames stay on one filesystem
+    try:
+        fd, tmpname = tempfile.mkstemp(prefix=f".{f.stem}_", suffix=f.suffix, dir=f.parent)
+        os.close(fd)
+    except Exception as e:
+        console.append((sys.stdout, f"Backup failed for {f}: {e}\n"))
+        return None, None, console
+    tmp = Path(tmpname)
+
+    fd, tmpname = tempfile.mkstemp(prefix="mie_", suffix=".log")
+    os.close(fd)                           # ← close the handle so Windows can delete later
+    file_log = Path(tmpname)
+
+    success, embedder_stderr = run_embedder(f, tmp, args_from_cli, file_log)
+    if embedder_stderr:
+        console.append((sys.stderr, embedder_stderr))
+    if not success:
+        tmp.unlink(missing_ok=True)
+        return success, file_log, console
+
+    bak = f.with_suffix(f.suffix + ".bak")
+    try:
+        shutil.copymode(f, tmp)            # mkstemp creates the file owner-only
+        os.replace(f, bak)
+    except Exception as e:
+        console.append((sys.stdout, f"Backup failed for {f}: {e}\n"))
+        tmp.unlink(missing_ok=True)
+        return False, file_log, console
+    try:
+        os.replace(tmp, f)
+    except Exception as e:
+        console.append((sys.stdout, f"Replacing {f} failed: {e}\n"))
+        os.replace(bak, f)                 # put the original back
+        tmp.unlink(missing_ok=True)
+        return False, file_log, console
+    return success, file_log, console
 
 # ───────────────────────────── helper to open the log in VS Code
 def open_log_in_vscode(log_path: Path) -> None:
@@ -75,9 +142,13 @@ def open_log_in_vscode(log_path: Path) -> None:
             ["cmd.exe", "/c", str(PIPE_TO_CODE), "-continue", str(log_path)],
             creationflags=subprocess.CREATE_NO_WINDOW,
         )
-        # give it a moment – if it exits in <0.5 s it almost certainly failed
-        time.sleep(0.5)
-        if proc.poll() is None:    # still running → good
+        # give it a moment – if it exits in <0.5 s it almost certainly failed,
+        # so poll in short steps and fall back as soon as it does
+        for _ in range(10):
+            time.sleep(0.05)
+            if proc.poll() is not None:
+                break
+        else:                      # still running → good
             return
         # otherwise fall through to direct Code launch
 
@@ -119,7 +190,12 @@ def main() -> int:
     # Resolve all files (Windows shell does NOT expand globs)
     files: List[Path] = []
     for patt in args.pattern:
-        matched = [Path(p) for p in glob.glob(patt, recursive=False)]
+        # A literal file is taken as is (one stat, like move_data_images.py), which
+        # also keeps names containing [ ] from being read as glob character classes
+        if os.path.isfile(patt):
+            matched = [Path(patt)]
+        else:
+            matched = [Path(p) for p in glob.glob(patt, recursive=False)]
         if not matched:
             print(f"No matches for pattern: {patt}")
         files.extend(matched)
@@ -127,41 +203,40 @@ def main() -> int:
         fail("Nothing to do.")
 
     master_log = Path(tempfile.gettempdir()) / f"mie_master_{os.getpid()}.log"
-    with master_log.open("w", encoding="utf-8") as mlog:
-        mlog.write("=== Markdown‑Image‑Embedder batch run ===\n")
-        mlog.write(f"Files: {len(files)}\n\n")
-
     ok = 0
-    for f in files:
-        if not f.exists():
-            print(f"Skip missing file: {f}")
-            continue
-
-        bak = f.with_suffix(f.suffix + ".bak")
-        try:
-            shutil.copy2(f, bak)
-        except Exception as e:
-            print(f"Backup failed for {f}: {e}")
-            continue
-
-        fd, tmpname = tempfile.mkstemp(prefix="mie_", suffix=".log")
-        os.close(fd)                           # ← close the handle so Windows can delete later
-        file_log = Path(tmpname)
-        success = run_embedder(bak, f, args, file_log)
-
-        with master_log.open("a", encoding="utf-8") as mlog, file_log.open(encoding="utf-8") as flog:
-            mlog.write(f"\n--- {f} ---\n")
-            mlog.writelines(flog.readlines())
-
-        file_log.unlink(missing_ok=True)
-        if success:
-            ok += 1
-            print(f"✓ {f}")
-        else:
-            print(f"✗ {f} (see log)")
-
-    with master_log.open("a", encoding="utf-8") as mlog:
-        mlog.write(f"\n=== Summary: {ok}/{len(files)} OK ===\n")
+    # The master log stays open for the whole batch; it is written as bytes so the
+    # per-file logs can be copied straight in.
+    with master_log.open("wb", buffering=1 << 16) as mlog:
+        mlog.write(log_text("=== Markdown‑Image‑Embedder batch run ===\n"))
+        mlog.write(log_text(f"Files: {len(files)}\n\n"))
+
+        # Each file gets its own embedder process, so several can run at once (a thread
+        # per file only waits on its subprocess). Results are taken in input order and
+        # each file's captured console output is printed with its ✓/✗ line, so the
+        # master log and console read the same as in a sequential run.
+        with ThreadPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as pool:
+            results = pool.map(lambda f: process_one(f, args), files)
+            for f, (success, file_log, console) in zip(files, results):
+                for stream, text in console:
+                    stream.write(text)
+                    stream.flush()
+                if file_log is None:
+                    continue
+
+                # Copy the per-file log across in chunks, so a large verbose log
+                # is never held in memory as a list of lines
+                with file_log.open("rb") as flog:
+                    mlog.write(log_text(f"\n--- {f} ---\n"))
+                    shutil.copyfileobj(flog, mlog, length=1 << 16)
+
+                file_log.unlink(missing_ok=True)
+                if success:
+                    ok += 1
+                    print(f"✓ {f}")
+                else:
+                    print(f"✗ {f} (see log)")
+
+        mlog.write(log_text(f"\n=== Summary: {ok}/{len(files)} OK ===\n"))
 
     # Fire up VS Code view of the log without blocking this process
     print("Opening master log in VS Code …")
@@ -28,7 +28,8 @@ import os
 import re
 import shutil
 import sys
-from collections import OrderedDict
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 
 IMAGE_RE = re.compile(
@@ -36,17 +37,25 @@ IMAGE_RE = re.compile(
     re.IGNORECASE,
 )
 
+# Below this much input in total, starting worker processes costs more than
+# it saves, so --overwrite batches run sequentially
+POOL_MIN_TOTAL_BYTES = 8 * 1024 * 1024
+
+# Runs of anything that can't appear in a generated id
+ID_SANITIZE_RE = re.compile(r'[^a-z0-9]+')
+
 
 def make_id(alt_text: str, existing_ids: set) -> str:
     """Build a reasonably readable, unique id like dataimg-some-alt-text."""
     base = (alt_text or "").strip().lower()
-    base = re.sub(r'[^a-z0-9]+', '-', base).strip('-') or "image"
-    candidate = f"dataimg-{base}"
+    base = ID_SANITIZE_RE.sub('-', base).strip('-') or "image"
+    prefix = f"dataimg-{base}"
+    if prefix not in existing_ids:
+        return prefix
     i = 2
-    while candidate in existing_ids:
-        candidate = f"dataimg-{base}-{i}"
+    while f"{prefix}-{i}" in existing_ids:
         i += 1
-    return candidate
+    return f"{prefix}-{i}"
 
 
 def transform(markdown: str) -> str:
@@ -54,25 +63,37 @@ def transform(markdown: str) -> str:
     Replace inline data:image Markdown with reference-style images
     and return the new Markdown with a reference block appended.
     """
-    # src -> (id, alt)
-    refs: "OrderedDict[str, tuple[str,str]]" = OrderedDict()
+    # Every match contains "](data:image" in some letter case, so a file with
+    # neither "](d" nor "](D" can be returned without running the regex at all
+    if "](d" not in markdown and "](D" not in markdown:
+        return markdown
+
+    # src -> (id, alt); dicts keep insertion order, so the block follows the document
+    refs: "dict[str, tuple[str, str]]" = {}
     existing_ids: set[str] = set()
 
-    def replacer(match: re.Match) -> str:
-        alt = match.group("alt") or ""
-        src = match.group("src")
+    # One finditer pass, gluing the untouched text and the rewritten images
+    # together, instead of re.sub calling back into Python for every match
+    parts: list[str] = []
+    last = 0
+    for match in IMAGE_RE.finditer(markdown):
+        alt = match["alt"] or ""
+        src = match["src"]
 
-        if src in refs:
-            img_id, _ = refs[src]
-        else:
+        ref = refs.get(src)
+        if ref is None:
             img_id = make_id(alt, existing_ids)
             refs[src] = (img_id, alt)
             existing_ids.add(img_id)
+        else:
+            img_id = ref[0]
 
         # keep the original alt text
-        return f"![{alt}][{img_id}]"
-
-    new_body = IMAGE_RE.sub(replacer, markdown)
+        parts.append(markdown[last:match.start()])
+        parts.append(f"![{alt}][{img_id}]")
+        last = match.end()
+    parts.append(markdown[last:])
+    new_body = "".join(parts)
 
     if not refs:
         # nothing to do
@@ -91,6 +112,52 @@ def transform(markdown: str) -> str:
     return "\n".join(lines)
 
 
+def overwrite_file(input_path: str, backup: bool) -> None:
+    """Transform one file in place, keeping the original as .bak if asked."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    transformed = transform(text)
+
+    # Write next to the original, then rename into place, so the input is
+    # never left half-written and a backup is a rename rather than a copy
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(input_path)}.",
+        suffix=".tmp",
+        dir=os.path.dirname(input_path) or ".",
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(transformed)
+        shutil.copymode(input_path, tmp_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    # If requested, keep the original as the backup
+    backup_path = None
+    if backup:
+        backup_path = input_path + ".bak"
+        try:
+            os.replace(input_path, backup_path)
+        except Exception as e:
+            os.remove(tmp_path)
+            print(
+                f"ERROR: Failed to create backup '{backup_path}': {e}",
+                file=sys.stderr,
+            )
+            raise SystemExit(1)
+
+    try:
+        os.replace(tmp_path, input_path)
+    except Exception:
+        # Put the original back rather than leaving only the .bak
+        if backup_path:
+            os.replace(backup_path, input_path)
+        os.remove(tmp_path)
+        raise
+
+
 def main(argv: list[str]) -> None:
     parser = argparse.ArgumentParser(
         description=(
@@ -153,26 +220,31 @@ def main(argv: list[str]) -> None:
         if args.output:
             parser.error("Do not specify an output file when using --overwrite/ -o.")
 
-        for input_path in unique_files:
-            # If requested, back up the original before we overwrite
-            if args.backup:
-                backup_path = input_path + ".bak"
+        total_size = sum(os.path.getsize(path) for path in unique_files)
+        if (
+            len(unique_files) > 1
+            and (os.cpu_count() or 1) > 1
+            and total_size >= POOL_MIN_TOTAL_BYTES
+        ):
+            # transform() is pure CPU work and the files are independent, so a
+            # large batch is spread over worker processes. The first failure
+            # cancels the files that haven't started, as the sequential loop
+            # would stop there.
+            with ProcessPoolExecutor() as executor:
+                futures = [
+                    executor.submit(overwrite_file, input_path, args.backup)
+                    for input_path in unique_files
+                ]
                 try:
-                    shutil.copy2(input_path, backup_path)
-                except Exception as e:
-                    print(
-                        f"ERROR: Failed to create backup '{backup_path}': {e}",
-                        file=sys.stderr,
-                    )
-                    raise SystemExit(1)
-
-            with open(input_path, "r", encoding="utf-8") as f:
-                text = f.read()
-
-            transformed = transform(text)
-
-            with open(input_path, "w", encoding="utf-8") as f:
-                f.write(transformed)
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        else:
+            for input_path in unique_files:
+                overwrite_file(input_path, args.backup)
 
     else:
         # Non-overwrite mode: must be exactly one resolved input file + explicit output
@@ -4,6 +4,7 @@ Setup script for MarkdownImageEmbedder.
 
 from setuptools import setup, find_packages
 import os
+import re
 
 # Read the contents of README.md
 this_directory = os.path.abspath(os.path.dirname(__file__))
@@ -12,10 +13,10 @@ with open(os.path.join(this_directory, 'README.md'), encoding='utf-8') as f:
 
 # Read version from __init__.py
 with open(os.path.join(this_directory, '__init__.py'), encoding='utf-8') as f:
-    for line in f:
-        if line.startswith('__version__'):
-            version = line.split('=')[1].strip().strip('"\'')
-            break
+    version_match = re.search(r'^__version__\s*=\s*["\']([^"\']+)', f.read(), re.M)
+if not version_match:
+    raise RuntimeError("Unable to find __version__ in __init__.py")
+version = version_match.group(1)
 
 setup(
     name="markdown-image-embedder",
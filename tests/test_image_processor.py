@@ -0,0 +1,39 @@
+"""
+Tests for unused/image_processor.py.
+"""
+
+import os
+import sys
+import unittest
+
+from PIL import Image
+
+# The unused/ modules import each other directly, as when run from that directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "unused"))
+
+import image_processor  # noqa: E402
+
+
+class FlattenToWhiteTest(unittest.TestCase):
+    """The NumPy and Pillow paths of _flatten_to_white must give the same pixels."""
+
+    @unittest.skipUnless(image_processor.NUMPY_SUPPORT, "NumPy is not installed")
+    def test_numpy_matches_alpha_composite(self):
+        # Every channel value against every alpha value
+        rgba = Image.new('RGBA', (256, 256))
+        rgba.putdata([(x, 255 - x, x // 2, a) for a in range(256) for x in range(256)])
+
+        numpy_result = image_processor.ImageProcessor._flatten_to_white(rgba)
+        image_processor.NUMPY_SUPPORT = False
+        try:
+            pillow_result = image_processor.ImageProcessor._flatten_to_white(rgba)
+        finally:
+            image_processor.NUMPY_SUPPORT = True
+
+        self.assertEqual(numpy_result.mode, 'RGB')
+        self.assertEqual(pillow_result.mode, 'RGB')
+        self.assertEqual(list(numpy_result.getdata()), list(pillow_result.getdata()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,12 @@
 Main entry point for MarkdownImageEmbedder.
 """
 
+import os
+import shutil
 import sys
 import logging
-from typing import List, Optional
+import tempfile
+from typing import Iterable, List, Optional, TextIO
 
 # Use direct imports instead of relative ones
 from cli_parser import CommandLineParser
@@ -14,6 +17,28 @@ from logger_setup import LoggerSetup
 from markdown_processor import MarkdownProcessor
 
 
+def write_chunks(chunks: Iterable[str], out: TextIO) -> Optional[Exception]:
+    """
+    Write pieces of output as they are produced.
+    
+    An error raised while producing a piece (i.e. while processing) propagates;
+    an error writing it is returned instead, so the two can be reported apart.
+    
+    Args:
+        chunks: The pieces of output, in order
+        out: The stream to write to
+        
+    Returns:
+        Optional[Exception]: The write error, or None if everything was written
+    """
+    for chunk in chunks:
+        try:
+            out.write(chunk)
+        except Exception as e:
+            return e
+    return None
+
+
 def main(args: Optional[List[str]] = None) -> int:
     """
     Main entry point for the application.
@@ -78,22 +103,57 @@ def main(args: Optional[List[str]] = None) -> int:
         
         # Process markdown
         logger.info("Processing markdown...")
-        output_markdown = markdown_processor.process(input_markdown)
+        output_chunks = markdown_processor.iter_process(input_markdown)
         
-        # Write output
-        try:
-            if options.output_file:
-                with open(options.output_file, 'w', encoding='utf-8') as f:
-                    f.write(output_markdown)
-                logger.info(f"Wrote output to file: {options.output_file}")
-            else:
-                # Write to stdout
-                sys.stdout.write(output_markdown)
-                sys.stdout.flush()
-                logger.info("Wrote output to stdout")
-        except Exception as e:
-            logger.error(f"Error writing output: {e}")
-            return 1
+        # Write output as it is produced. Processing errors are raised out of
+        # write_chunks to the handler below, as when process() ran first.
+        if options.output_file:
+            # Written next to the output file and renamed over it once complete,
+            # so a failure partway through leaves an existing file untouched
+            try:
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=f".{os.path.basename(options.output_file)}.",
+                    suffix=".tmp",
+                    dir=os.path.dirname(os.path.abspath(options.output_file)),
+                )
+            except Exception as e:
+                logger.error(f"Error writing output: {e}")
+                return 1
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    write_error = write_chunks(output_chunks, f)
+                if write_error is None:
+                    try:
+                        # mkstemp creates the file owner-only; give it the mode
+                        # open() would have left it with
+                        if os.path.exists(options.output_file):
+                            shutil.copymode(options.output_file, tmp_path)
+                        else:
+                            umask = os.umask(0)
+                            os.umask(umask)
+                            os.chmod(tmp_path, 0o666 & ~umask)
+                        os.replace(tmp_path, options.output_file)
+                    except Exception as e:
+                        write_error = e
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            if write_error is not None:
+                logger.error(f"Error writing output: {write_error}")
+                return 1
+            logger.info(f"Wrote output to file: {options.output_file}")
+        else:
+            # Write to stdout
+            write_error = write_chunks(output_chunks, sys.stdout)
+            if write_error is None:
+                try:
+                    sys.stdout.flush()
+                except Exception as e:
+                    write_error = e
+            if write_error is not None:
+                logger.error(f"Error writing output: {write_error}")
+                return 1
+            logger.info("Wrote output to stdout")
             
         # Log non-embedded resources
         if markdown_processor.non_embedded_resources:
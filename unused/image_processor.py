@@ -6,39 +6,190 @@ import io
 import logging
 import mimetypes
 import os
-from typing import Optional, Tuple
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
 
-from PIL import Image
+from PIL import Image, features
+
+# NumPy is optional; when available it is used to flatten transparency
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+
+# PyTurboJPEG is optional; when available it recompresses JPEG input through
+# the libjpeg-turbo C API without building a PIL image
+try:
+    from turbojpeg import TurboJPEG, TJFLAG_PROGRESSIVE, TJSAMP_420, TJSAMP_444
+    _turbo_jpeg = TurboJPEG()
+    TURBOJPEG_SUPPORT = True
+except Exception:  # ImportError, or the libturbojpeg shared library is missing
+    _turbo_jpeg = None
+    TURBOJPEG_SUPPORT = False
+
+# Whether Pillow's JPEG codec is backed by libjpeg-turbo (SIMD DCT and Huffman coding)
+try:
+    LIBJPEG_TURBO = bool(features.check_feature('libjpeg_turbo'))
+except Exception:
+    LIBJPEG_TURBO = False
+
+# Upper bounds (inclusive) of the file size buckets used for quality selection
+_SIZE_THRESHOLDS = (
+    1 * 1024,    # ~1KB
+    5 * 1024,    # ~5KB
+    20 * 1024,   # ~20KB
+    50 * 1024,   # ~50KB
+    100 * 1024,  # ~100KB
+    200 * 1024,  # ~200KB
+)
+
+# Quality table based on file size ranges and quality scale
+# Format: [file_size_range][quality_scale]
+_QUALITY_TABLE = (
+    # Quality Scale:   1    2    3    4    5    6    7    8    9
+    (100, 100, 100, 100, 100, 100, 100, 100, 100),  # ~1KB
+    (30, 45, 60, 75, 90, 92, 94, 96, 98),           # ~5KB
+    (25, 37, 49, 60, 70, 77, 83, 89, 95),           # ~20KB
+    (20, 28, 36, 43, 50, 60, 70, 80, 90),           # ~50KB
+    (15, 22, 28, 34, 40, 52, 63, 74, 85),           # ~100KB
+    (12, 16, 19, 22, 25, 40, 53, 67, 80),           # ~200KB
+    (10, 12, 14, 16, 18, 33, 47, 61, 75),           # >=200KB
+)
+
+
+@lru_cache(maxsize=1024)
+def _jpeg_quality(quality_scale: int, file_size_bytes: int) -> int:
+    """
+    Look up the JPEG quality for a quality scale and file size.
+    
+    Args:
+        quality_scale: Quality scale (1-9)
+        file_size_bytes: Size of the file in bytes
+        
+    Returns:
+        int: The JPEG quality (0-100)
+    """
+    # Find the first size bucket whose upper bound is >= the file size;
+    # anything larger than 200KB falls into the last row
+    row_index = bisect_left(_SIZE_THRESHOLDS, file_size_bytes)
+    return _QUALITY_TABLE[row_index][quality_scale - 1]
+
+
+# Four-byte video signatures found at the start of the file
+_VIDEO_HEADERS = frozenset((
+    b'\x00\x00\x01\xBA',  # MPEG Program Stream
+    b'\x1A\x45\xDF\xA3',  # Matroska/WebM
+))
+
+# Signatures checked at other offsets or lengths by is_video_file
+_FTYP = b'ftyp'  # MP4/QuickTime, at offset 4
+_RIFF = b'RIFF'  # RIFF container, at offset 0 ...
+_AVI = b'AVI '   # ... with an AVI form type at offset 8
+_FLV = b'FLV'    # Flash Video, at offset 0
+
+# JPEG start-of-image marker followed by the first segment marker
+_JPEG_SOI = b'\xFF\xD8\xFF'
+
+# Common image types
+_EXT_TO_MIME = {
+    '.jpg': "image/jpeg",
+    '.jpeg': "image/jpeg",
+    '.png': "image/png",
+    '.gif': "image/gif",
+    '.bmp': "image/bmp",
+    '.webp': "image/webp",
+    '.svg': "image/svg+xml",
+}
+
+
+@lru_cache(maxsize=64)
+def _mime_from_ext(ext: str) -> str:
+    """
+    Determine the MIME type from a lowercased file extension.
+    
+    Args:
+        ext: The file extension including the leading dot (may be empty)
+        
+    Returns:
+        str: The MIME type
+    """
+    if not ext:
+        # Default to JPEG
+        return "image/jpeg"
+        
+    mime_type = _EXT_TO_MIME.get(ext)
+    if mime_type:
+        return mime_type
+        
+    # Use mimetypes library as fallback
+    mime_type, _ = mimetypes.guess_type("x" + ext)
+    if mime_type and mime_type.startswith('image/'):
+        return mime_type
+        
+    # Default to JPEG
+    return "image/jpeg"
+
+
+def _compress_worker(job: Tuple[int, Optional[int], bytes]) -> Optional[bytes]:
+    """
+    Compress a single image in a worker process.
+    
+    Args:
+        job: Tuple of (quality_scale, max_dim, input_data)
+        
+    Returns:
+        bytes: The compressed JPEG data, or None if compression failed
+    """
+    quality_scale, max_dim, input_data = job
+    return ImageProcessor(quality_scale, max_dim).compress_to_jpeg(input_data)
 
 
 class ImageProcessor:
     """Handles image processing operations."""
 
-    def __init__(self, quality_scale: int = 5):
+    # Whether the missing libjpeg-turbo warning has already been logged
+    _backend_warned: bool = False
+
+    def __init__(self, quality_scale: int = 5, max_dim: Optional[int] = None):
         """
         Initialize the ImageProcessor.
         
         Args:
             quality_scale: Quality scale (1-9) that affects compression 
                            based on file size (1=highest quality, 9=lowest)
+            max_dim: Optional maximum width/height in pixels; larger images are
+                     downscaled (preserving aspect ratio) before encoding
         """
         self.logger = logging.getLogger(__name__)
         self.quality_scale = quality_scale
+        self.max_dim = max_dim
         
         # Validate quality scale range
-        if self.quality_scale < 1 or self.quality_scale > 9:
+        if not 1 <= self.quality_scale <= 9:
             self.logger.warning("Invalid quality scale value. Using default (5).")
             self.quality_scale = 5
             
+        # JPEG encoding is the hot path; plain libjpeg is several times slower.
+        # Only warn once per process rather than for every instance.
+        if not LIBJPEG_TURBO and not ImageProcessor._backend_warned:
+            ImageProcessor._backend_warned = True
+            self.logger.warning(
+                "Pillow is not built with libjpeg-turbo; JPEG compression will be slower. "
+                "Install a libjpeg-turbo build of Pillow (e.g. pip install --upgrade pillow or pillow-simd)."
+            )
+            
         # Track the most recent compression results
         self.last_jpeg_quality: int = 0
         self.last_original_size: int = 0
         self.last_compressed_size: int = 0
-        
-        # Initialize MIME types
-        mimetypes.init()
+        self.last_subsampling: int = 0
 
-    def calculate_jpeg_quality(self, file_size_bytes: int) -> int:
+    def calculate_jpeg_quality(self, file_size_bytes: int, *, _jpeg_quality=_jpeg_quality) -> int:
         """
         Calculate the JPEG quality level based on file size and quality scale.
         
@@ -48,50 +199,16 @@ class ImageProcessor:
         Returns:
             int: The calculated JPEG quality (0-100)
         """
-        # Define the file size thresholds in bytes
-        SIZE_1KB = 1 * 1024
-        SIZE_5KB = 5 * 1024
-        SIZE_20KB = 20 * 1024
-        SIZE_50KB = 50 * 1024
-        SIZE_100KB = 100 * 1024
-        SIZE_200KB = 200 * 1024
-        
-        # Quality table based on file size ranges and quality scale
-        # Format: [file_size_range][quality_scale]
-        quality_table = [
-            # Quality Scale:   1    2    3    4    5    6    7    8    9
-            [100, 100, 100, 100, 100, 100, 100, 100, 100],  # ~1KB
-            [30, 45, 60, 75, 90, 92, 94, 96, 98],           # ~5KB
-            [25, 37, 49, 60, 70, 77, 83, 89, 95],           # ~20KB
-            [20, 28, 36, 43, 50, 60, 70, 80, 90],           # ~50KB
-            [15, 22, 28, 34, 40, 52, 63, 74, 85],           # ~100KB
-            [12, 16, 19, 22, 25, 40, 53, 67, 80],           # ~200KB
-            [10, 12, 14, 16, 18, 33, 47, 61, 75]            # >=200KB
-        ]
-        
-        # Determine row index based on file size
-        if file_size_bytes <= SIZE_1KB:
-            row_index = 0
-        elif file_size_bytes <= SIZE_5KB:
-            row_index = 1
-        elif file_size_bytes <= SIZE_20KB:
-            row_index = 2
-        elif file_size_bytes <= SIZE_50KB:
-            row_index = 3
-        elif file_size_bytes <= SIZE_100KB:
-            row_index = 4
-        elif file_size_bytes <= SIZE_200KB:
-            row_index = 5
-        else:
-            # For any file larger than 200KB, use the last row
-            row_index = 6
-            
-        # Adjust the quality scale index (0-based)
-        quality_scale_index = self.quality_scale - 1
-        
-        return quality_table[row_index][quality_scale_index]
-
-    def compress_to_jpeg(self, input_data: bytes) -> Optional[bytes]:
+        return _jpeg_quality(self.quality_scale, file_size_bytes)
+
+    def compress_to_jpeg(
+        self,
+        input_data: bytes,
+        *,
+        # Hot-path globals bound as locals (LOAD_FAST instead of LOAD_GLOBAL)
+        _BytesIO=io.BytesIO,
+        _image_open=Image.open,
+    ) -> Optional[bytes]:
         """
         Compress image data to JPEG format.
         
@@ -101,50 +218,229 @@ class ImageProcessor:
         Returns:
             bytes: The compressed JPEG data, or None if compression failed or should be skipped
         """
-        # Log original file size
         original_size = len(input_data)
+        jpeg_quality = self._start_compression(original_size, input_data[:3])
+        if jpeg_quality is None:
+            return input_data
+            
+        # JPEG to JPEG recompression can bypass PIL entirely
+        if TURBOJPEG_SUPPORT and not self.max_dim and input_data[:3] == _JPEG_SOI:
+            output_data = self._recompress_turbojpeg(input_data, jpeg_quality)
+            if output_data is not None:
+                return output_data
+                
+        try:
+            # Open the image using PIL; the context managers release the input
+            # buffer and decoder as soon as encoding has finished
+            with _BytesIO(input_data) as input_buffer, _image_open(input_buffer) as source:
+                return self._encode(source, jpeg_quality)
+                
+        except Exception as e:
+            self.logger.error(f"Error compressing image: {e}")
+            return None
+
+    def compress_path(self, path: str) -> Optional[bytes]:
+        """
+        Compress an image file on disk to JPEG format.
+        
+        The file is decoded directly by PIL rather than first being read into
+        memory, so only one copy of the source exists at a time.
+        
+        Args:
+            path: Path to the image file
+            
+        Returns:
+            bytes: The compressed JPEG data, or None if compression failed or should be skipped
+        """
+        try:
+            original_size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                header = f.read(3)
+                jpeg_quality = self._start_compression(original_size, header)
+                if jpeg_quality is None:
+                    f.seek(0)
+                    return f.read()
+                    
+                # libjpeg-turbo needs the JPEG in memory, as in compress_to_jpeg
+                f.seek(0)
+                if TURBOJPEG_SUPPORT and not self.max_dim and header == _JPEG_SOI:
+                    output_data = self._recompress_turbojpeg(f.read(), jpeg_quality)
+                    if output_data is not None:
+                        return output_data
+                    f.seek(0)
+                    
+                with Image.open(f) as source:
+                    return self._encode(source, jpeg_quality)
+                    
+        except Exception as e:
+            self.logger.error(f"Error compressing image: {path} - {e}")
+            return None
+
+    def _start_compression(self, original_size: int, header: bytes, *, _jpeg_soi=_JPEG_SOI) -> Optional[int]:
+        """
+        Record the original size and pick the JPEG quality for a new image.
+        
+        Args:
+            original_size: Size of the original image data in bytes
+            header: The first three bytes of the image data
+            
+        Returns:
+            int: The JPEG quality to encode at, or None if the original data
+                 should be returned unchanged
+        """
+        # Log original file size
         self.last_original_size = original_size
         
         # Calculate the JPEG quality based on file size and quality scale
         jpeg_quality = self.calculate_jpeg_quality(original_size)
         self.last_jpeg_quality = jpeg_quality
         
-        # If quality is 100 and file is very small (≤ 1KB), return the original data
-        if jpeg_quality == 100 and original_size <= 1024:
-            self.logger.debug(f"Small image ({original_size} bytes): no compression needed")
+        # Quality 100 means the table decided no compression is warranted, and
+        # re-encoding at q=100 typically grows the file, so return the original data
+        if jpeg_quality == 100 and not self.max_dim:
+            self.logger.debug(f"Image at quality 100 ({original_size} bytes): no compression needed")
             # Mark as no compression performed
             self.last_compressed_size = original_size
-            return input_data
+            return None
             
-        try:
-            # Open the image using PIL
-            img = Image.open(io.BytesIO(input_data))
+        # An existing JPEG at a near-lossless target quality cannot shrink
+        # meaningfully, so skip the decode/re-encode round trip entirely
+        if jpeg_quality >= 90 and header == _jpeg_soi and not self.max_dim:
+            self.logger.debug(f"Already a small JPEG ({original_size} bytes): no compression needed")
+            self.last_compressed_size = original_size
+            return None
+            
+        return jpeg_quality
+
+    def _encode(self, source: Image.Image, jpeg_quality: int) -> bytes:
+        """
+        Encode an opened image as JPEG.
+        
+        Args:
+            source: The opened source image
+            jpeg_quality: The JPEG quality to encode at
+            
+        Returns:
+            bytes: The compressed JPEG data
+        """
+        # Create an output buffer; a fresh one per image, so the encoded JPEG
+        # isn't kept alive after it has been returned
+        output_buffer = io.BytesIO()
+        
+        # Decode once up front instead of lazily on the first pixel access
+        source.load()
+        img = source
+        
+        # Downscale oversized images before encoding; encode cost scales with pixel count
+        if self.max_dim and max(img.size) > self.max_dim:
+            self.logger.debug(
+                f"Resizing image from {img.size[0]}x{img.size[1]} to fit {self.max_dim}x{self.max_dim}"
+            )
+            img.thumbnail((self.max_dim, self.max_dim), Image.LANCZOS)
+        
+        # Check if image has alpha channel
+        if img.mode == 'P' and 'transparency' in img.info:
+            img = img.convert('RGBA')
+        if img.mode in ('RGBA', 'LA'):
+            rgba = img if img.mode == 'RGBA' else img.convert('RGBA')
+            img = self._flatten_to_white(rgba)
+        
+        # Use 4:2:0 chroma subsampling for low/medium qualities, but keep
+        # 4:4:4 for near-lossless output to avoid color bleed
+        subsampling = 2 if jpeg_quality < 90 else 0
+        self.last_subsampling = subsampling
+        
+        # Save as progressive JPEG with the calculated quality. libjpeg derives
+        # the quantization tables from the quality setting at negligible cost;
+        # optimize=True is what builds per-image Huffman tables, and those depend
+        # on the image's coefficients, so they cannot be precomputed per quality.
+        img.save(
+            output_buffer, format='JPEG', quality=jpeg_quality,
+            optimize=True, progressive=True, subsampling=subsampling
+        )
+        
+        # getvalue() shrinks and hands back the internal buffer rather than
+        # copying it, so it is cheaper than bytes(output_buffer.getbuffer())
+        output_data = output_buffer.getvalue()
+        
+        # Store the compressed size
+        self.last_compressed_size = len(output_data)
+        
+        return output_data
+
+    def _recompress_turbojpeg(self, input_data: bytes, jpeg_quality: int) -> Optional[bytes]:
+        """
+        Recompress JPEG data with libjpeg-turbo via PyTurboJPEG.
+        
+        Args:
+            input_data: The original JPEG data
+            jpeg_quality: The JPEG quality to encode at
             
-            # Create an output buffer
-            output_buffer = io.BytesIO()
+        Returns:
+            bytes: The compressed JPEG data, or None if PIL should be used instead
+                   (e.g. for CMYK JPEGs that libjpeg-turbo cannot convert)
+        """
+        # Same chroma subsampling choice as the PIL path
+        subsampling = 2 if jpeg_quality < 90 else 0
+        try:
+            pixels = _turbo_jpeg.decode(input_data)
+            output_data = _turbo_jpeg.encode(
+                pixels, quality=jpeg_quality,
+                jpeg_subsample=TJSAMP_420 if subsampling else TJSAMP_444,
+                flags=TJFLAG_PROGRESSIVE,
+            )
+        except Exception as e:
+            self.logger.debug(f"turbojpeg recompression failed, falling back to PIL: {e}")
+            return None
             
-            # Check if image has alpha channel
-            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                # Convert transparent background to white
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'RGBA':
-                    background.paste(img, mask=img.split()[3])
-                else:
-                    background.paste(img, mask=img.convert('RGBA').split()[3])
-                img = background
+        self.last_subsampling = subsampling
+        self.last_compressed_size = len(output_data)
+        return output_data
+
+    @staticmethod
+    def _flatten_to_white(rgba: Image.Image) -> Image.Image:
+        """
+        Composite an RGBA image onto a white background.
+        
+        Args:
+            rgba: The RGBA image to flatten
             
-            # Save as JPEG with the calculated quality
-            img.save(output_buffer, format='JPEG', quality=jpeg_quality, optimize=True)
-            output_data = output_buffer.getvalue()
+        Returns:
+            Image.Image: The flattened RGB image
+        """
+        if NUMPY_SUPPORT:
+            # Vectorized blend: rgb * a + white * (255 - a), computed in uint16
+            # and rounded (+127) like Image.alpha_composite, so both paths agree
+            arr = np.asarray(rgba)
+            alpha = arr[..., 3:4].astype(np.uint16)
+            rgb = arr[..., :3].astype(np.uint16) * alpha + 255 * (255 - alpha) + 127
+            # An HxWx3 uint8 array is read as RGB
+            return Image.fromarray((rgb // 255).astype(np.uint8))
             
-            # Store the compressed size
-            self.last_compressed_size = len(output_data)
+        # Composite onto a white background in a single pass
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, rgba).convert('RGB')
+
+    def compress_many(self, blobs: Iterable[bytes], workers: Optional[int] = None) -> List[Optional[bytes]]:
+        """
+        Compress several images in parallel across multiple processes.
+        
+        The per-image ``last_*`` results are not tracked for batch calls.
+        
+        Args:
+            blobs: The original image data for each image
+            workers: Maximum number of worker processes (defaults to the CPU count)
             
-            return output_data
+        Returns:
+            List[Optional[bytes]]: The compressed JPEG data for each image, in input order,
+                                   with None for images that failed to compress
+        """
+        jobs = [(self.quality_scale, self.max_dim, blob) for blob in blobs]
+        if not jobs:
+            return []
             
-        except Exception as e:
-            self.logger.error(f"Error compressing image: {e}")
-            return None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_compress_worker, jobs, chunksize=4))
 
     @staticmethod
     def get_mime_type(url: str) -> str:
@@ -157,38 +453,19 @@ class ImageProcessor:
         Returns:
             str: The MIME type
         """
-        # Extract the file extension
-        _, ext = os.path.splitext(url)
-        if not ext:
-            # Default to JPEG
-            return "image/jpeg"
-            
-        # Normalize extension
-        ext = ext.lower()
-        
-        # Common image types
-        if ext == '.jpg' or ext == '.jpeg':
-            return "image/jpeg"
-        elif ext == '.png':
-            return "image/png"
-        elif ext == '.gif':
-            return "image/gif"
-        elif ext == '.bmp':
-            return "image/bmp"
-        elif ext == '.webp':
-            return "image/webp"
-        elif ext == '.svg':
-            return "image/svg+xml"
-        
-        # Use mimetypes library as fallback
-        mime_type, _ = mimetypes.guess_type(url)
-        if mime_type and mime_type.startswith('image/'):
-            return mime_type
-            
-        # Default to JPEG
-        return "image/jpeg"
+        # Only remote URLs carry a query string or fragment. A local url here is
+        # the resolved path of a file that exists, where '?' and '#' are literal
+        # characters of the name (e.g. "chart#2.png"), so it is used as is.
+        path = urlsplit(url).path if "://" in url else url
+        
+        # Extract and normalize the file extension; a dot only counts if it is
+        # inside the last path component and is not its leading character
+        dot = path.rfind('.')
+        if dot <= max(path.rfind('/'), path.rfind('\\')) + 1:
+            return _mime_from_ext('')
+        return _mime_from_ext(path[dot:].lower())
 
-    def is_video_file(self, data: bytes) -> bool:
+    def is_video_file(self, data: bytes, *, _video_headers=_VIDEO_HEADERS) -> bool:
         """
         Check if the file data appears to be a video.
         
@@ -201,25 +478,23 @@ class ImageProcessor:
         if len(data) < 12:
             return False
             
-        # Check for common video file signatures
-        # MPEG Transport Stream
-        if data[0:4] == b'\x00\x00\x01\xBA':
-            return True
-            
-        # Matroska/WebM
-        if data[0:4] == b'\x1A\x45\xDF\xA3':
+        # Only the first 12 bytes are ever inspected; copying them once also
+        # accepts a memoryview or bytearray, and keeps the checks below cheap
+        data = bytes(data[:12])
+        
+        # Check for common video file signatures anchored at offset 0
+        # (MPEG Program Stream, Matroska/WebM)
+        head = data[:4]
+        if head in _video_headers:
             return True
             
         # MP4/QuickTime
-        if data[4:8] == b'ftyp':
+        if data.startswith(_FTYP, 4):
             return True
             
         # AVI
-        if data[0:4] == b'RIFF' and data[8:12] == b'AVI ':
+        if head == _RIFF and data.startswith(_AVI, 8):
             return True
             
         # Flash Video
-        if data[0:3] == b'FLV':
-            return True
-            
-        return False
+        return head.startswith(_FLV)
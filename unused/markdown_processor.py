@@ -5,8 +5,12 @@ Markdown processing module for MarkdownImageEmbedder.
 import logging
 import os
 import re
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Set
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 # Use direct imports instead of relative ones
 from base64_encoder import Base64Encoder
@@ -14,6 +18,27 @@ from http_client import HttpClient
 from image_processor import ImageProcessor
 
 
+@lru_cache(maxsize=4096)
+def _isfile(path: str) -> bool:
+    """
+    os.path.isfile with the answer cached.
+    
+    A local image is probed as written, again by resolve_file_path, and again
+    after Yarle resolution, so each distinct path is only stat'ed once.
+    MarkdownProcessor clears the cache at the start of each document.
+    
+    Args:
+        path: The path to check
+        
+    Returns:
+        bool: True if the path is an existing regular file
+    """
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except (OSError, ValueError):
+        return False
+
+
 @dataclass
 class ImageMatch:
     """Represents a matched image in markdown."""
@@ -27,12 +52,34 @@ class ImageMatch:
 class MarkdownProcessor:
     """Processes markdown and embeds images."""
 
-    # Regular expression for markdown image links
-    IMAGE_PATTERN = re.compile(r'!\[(?:[^\]]*?)(?:\|(?:[^\]]*?))?\]\((?!data:image)(?:[^\)]*?)\)')
+    # Regular expression for markdown image links: Obsidian/Yarle ![[path]] or
+    # standard ![alt](url), with the parts captured so no re-parsing is needed
+    IMAGE_PATTERN = re.compile(
+        r'!\[\[(?P<obsidian_url>[^\]]+)\]\]'
+        r'|!\[(?P<alt>[^\]]*)\]\((?!data:image)(?P<url>[^\)]*)\)'
+    )
+
+    # Dimension suffix on a URL or link target: "|100x200", or "\|100x200" when the
+    # pipe is escaped inside a table; everything from the pipe on is dropped
+    DIMENSION_PATTERN = re.compile(r'\\?\|.*', re.DOTALL)
+
+    REMOTE_URL_PREFIXES = ("http://", "https://")
+    EMBEDDED_IMAGE_PREFIXES = ("data:image/", "data:image%2F")
+
+    # Trailing slashes, quotes and whitespace trimmed from paths before lookup
+    PATH_TRIM_CHARS = '/\\"\' \t\r\n'
     
     # Approximate size overhead for markdown embedded images
     MARKDOWN_IMAGE_OVERHEAD = 100  # Base64 data URL overhead in bytes
 
+    # Images downloaded/compressed at once; downloads wait on the network and
+    # requests/Pillow release the GIL, so threads overlap well
+    MAX_IMAGE_WORKERS = 8
+
+    # Leading bytes of a local file read for ImageProcessor.is_video_file,
+    # which looks at no more than the first 12
+    VIDEO_HEADER_SIZE = 16
+
     def __init__(
         self, 
         http_client: HttpClient, 
@@ -65,6 +112,15 @@ class MarkdownProcessor:
         self.total_output_size: int = 0
         self.images_processed: int = 0
         self.skipped_images: int = 0
+        
+        # Guards the counters above while images are processed in parallel
+        # (set.add on non_embedded_resources is already atomic)
+        self._stats_lock = threading.Lock()
+        
+        # Encoded images for the current document, keyed by source, so repeated
+        # references are only loaded and compressed once
+        self._embed_cache: Dict[tuple, Tuple[str, str, int, int]] = {}
+        self._source_locks: Dict[tuple, threading.Lock] = {}
 
     def process(self, markdown: str) -> str:
         """
@@ -76,48 +132,74 @@ class MarkdownProcessor:
         Returns:
             str: The processed markdown with embedded images
         """
+        return ''.join(self.iter_process(markdown))
+
+    def iter_process(self, markdown: str) -> Iterator[str]:
+        """
+        Process markdown and embed images, yielding the output in pieces.
+        
+        The output never has to exist as one string, so it can be written out
+        as it is produced. Statistics are final once the iterator is exhausted.
+        
+        Args:
+            markdown: The input markdown text
+            
+        Yields:
+            str: Consecutive pieces of the processed markdown
+        """
         original_markdown_size = len(markdown)
         
         # Reset statistics
         self.total_image_size = 0
         self.total_compressed_size = 0
+        self.total_output_size = 0
         self.images_processed = 0
         self.skipped_images = 0
         self.non_embedded_resources.clear()
+        self._embed_cache.clear()
+        self._source_locks.clear()
+        _isfile.cache_clear()
         
+        # Every image form handled here starts with "![", so a document without it
+        # is passed through without running the regex at all
+        if "![" not in markdown:
+            self.total_output_size = original_markdown_size
+            if markdown:
+                yield markdown
+            self._log_processing_results(original_markdown_size)
+            return
+            
         # Find all image links in the markdown
         matches = self.find_image_links(markdown)
         self.logger.debug(f"Found {len(matches)} image links in markdown")
         
-        # Process matches in forward order
-        result = []
+        # Process matches in parallel, but output them in forward order
         last_pos = 0
         
-        for match in matches:
-            # Output the text between last match and this match
-            if match.position > last_pos:
-                result.append(markdown[last_pos:match.position])
+        if matches:
+            with ThreadPoolExecutor(max_workers=min(self.MAX_IMAGE_WORKERS, len(matches))) as pool:
+                futures = [pool.submit(self.process_image_match, match) for match in matches]
                 
-            # Process the image match
-            self.logger.debug(f"Processing image match at position {match.position}")
-            embedded_image = self.process_image_match(match)
-            result.append(embedded_image)
-            
-            # Update the last position
-            last_pos = match.position + match.length
+                for match, future in zip(matches, futures):
+                    # Output the text between last match and this match
+                    if match.position > last_pos:
+                        self.total_output_size += match.position - last_pos
+                        yield markdown[last_pos:match.position]
+                        
+                    embedded_image = future.result()
+                    self.total_output_size += len(embedded_image)
+                    yield embedded_image
+                    
+                    # Update the last position
+                    last_pos = match.position + match.length
             
         # Output any remaining text after the last match
         if last_pos < len(markdown):
-            result.append(markdown[last_pos:])
-            
-        # Join the result
-        output = ''.join(result)
-        self.total_output_size = len(output)
+            self.total_output_size += len(markdown) - last_pos
+            yield markdown[last_pos:]
         
         # Log processing results
         self._log_processing_results(original_markdown_size)
-        
-        return output
 
     def _log_processing_results(self, original_markdown_size: int) -> None:
         """
@@ -177,33 +259,22 @@ class MarkdownProcessor:
             if match_text == "![]()":
                 continue
                 
-            # Process different image syntax formats
-            if match_text.startswith("![[") and "]]" in match_text:
+            obsidian_url = match.group("obsidian_url")
+            if obsidian_url is not None:
                 # Obsidian/Yarle format: ![[path]]
-                start = match_text.find("[[") + 2
-                end = match_text.find("]]", start)
-                if end != -1:
-                    url = match_text[start:end]
-                    alt_text = ""
-                    matches.append(ImageMatch(match_text, alt_text, url, position, length))
-            elif match_text.startswith("![") and "](" in match_text:
+                matches.append(ImageMatch(match_text, "", obsidian_url, position, length))
+            else:
                 # Standard markdown: ![alt](url)
-                alt_start = match_text.find("[") + 1
-                alt_end = match_text.find("]", alt_start)
-                url_start = match_text.find("(", alt_end) + 1
-                url_end = match_text.find(")", url_start)
+                alt_text = match.group("alt")
+                url = match.group("url")
                 
-                if alt_end != -1 and url_end != -1:
-                    alt_text = match_text[alt_start:alt_end]
-                    url = match_text[url_start:url_end]
+                # Handle pipe character in alt text (for dimensions)
+                if "\\|" in alt_text:  # Escaped pipe
+                    alt_text = alt_text.split("\\|")[0]
+                elif "|" in alt_text:  # Normal pipe
+                    alt_text = alt_text.split("|")[0]
                     
-                    # Handle pipe character in alt text (for dimensions)
-                    if "\\|" in alt_text:  # Escaped pipe
-                        alt_text = alt_text.split("\\|")[0]
-                    elif "|" in alt_text:  # Normal pipe
-                        alt_text = alt_text.split("|")[0]
-                        
-                    matches.append(ImageMatch(match_text, alt_text, url, position, length))
+                matches.append(ImageMatch(match_text, alt_text, url, position, length))
                     
         return matches
 
@@ -218,16 +289,16 @@ class MarkdownProcessor:
             str: The resolved file path if found, empty string otherwise
         """
         # Clean up the path
-        clean_path = path.rstrip('/\\"\' \t\r\n')
+        clean_path = path.rstrip(self.PATH_TRIM_CHARS)
         
         # Try the path as-is
-        if os.path.isfile(clean_path):
+        if _isfile(clean_path):
             return clean_path
             
         # If base path is provided, try joining with it
         if self.base_path:
             # Remove trailing slashes and quotes from base path
-            base_path = self.base_path.rstrip('/\\"\' \t\r\n')
+            base_path = self.base_path.rstrip(self.PATH_TRIM_CHARS)
             
             # Handle relative paths
             relative_path = clean_path
@@ -238,7 +309,7 @@ class MarkdownProcessor:
             full_path = os.path.join(base_path, relative_path)
             
             # Check if the full path exists
-            if os.path.isfile(full_path):
+            if _isfile(full_path):
                 return full_path
                 
         return ""
@@ -253,7 +324,7 @@ class MarkdownProcessor:
         Returns:
             bool: True if the URL is an embedded image data URL
         """
-        return url.startswith("data:image/") or url.startswith("data:image%2F")
+        return url.startswith(self.EMBEDDED_IMAGE_PREFIXES)
 
     def process_image_match(self, match: ImageMatch) -> str:
         """
@@ -267,22 +338,16 @@ class MarkdownProcessor:
         """
         url = match.url
         is_local_file = False
-        image_data = None
         
-        self.logger.debug(f"Processing image: {url}")
+        self.logger.debug(f"Processing image match at position {match.position}: {url}")
         
         # Handle Obsidian/Yarle syntax
         if url.startswith("[[") and url.endswith("]]"):
             url = url[2:-2]
             
         # Remove dimension specifications and clean up the URL
-        if "|" in url:
-            url = url.split("|")[0]
-        if "\\|" in url:
-            url = url.split("\\|")[0]
-            
-        # Clean up the URL by removing trailing spaces or special characters
-        url = url.strip()
+        url = self.DIMENSION_PATTERN.sub("", url, count=1).strip()
+        is_remote = url.startswith(self.REMOTE_URL_PREFIXES)
         
         # Skip already embedded images
         if self.is_embedded_image(url):
@@ -290,7 +355,7 @@ class MarkdownProcessor:
             return match.original_text
             
         # Handle Yarle resource paths
-        if self.yarle_mode and not url.startswith(("http://", "https://")):
+        if self.yarle_mode and not is_remote:
             if "./_resources/" in url or ".resources/" in url:
                 self.logger.debug(f"Handling Yarle resource path: {url}")
                 resolved_path = self.resolve_file_path(url)
@@ -299,11 +364,11 @@ class MarkdownProcessor:
                     self.logger.debug(f"Resolved to: {url}")
                     
         # Handle local files vs remote URLs
-        if not url.startswith(("http://", "https://")):
+        if not is_remote:
             is_local_file = True
             
             # Try to resolve the path if it doesn't exist as-is
-            if not os.path.isfile(url):
+            if not _isfile(url):
                 resolved_path = self.resolve_file_path(url)
                 if resolved_path:
                     url = resolved_path
@@ -312,55 +377,150 @@ class MarkdownProcessor:
                     self.non_embedded_resources.add(url)
                     return match.original_text
                     
-            # Read the file
+        # The same image is often referenced many times (e.g. in Yarle exports), so
+        # each source is loaded and encoded once per document; the lock makes other
+        # threads wanting the same source wait for that result instead of redoing it
+        cache_key = ("file", os.path.abspath(url)) if is_local_file else ("url", url)
+        with self._source_lock(cache_key):
+            entry = self._embed_cache.get(cache_key)
+            if entry is not None:
+                mime_type, base64_data, image_size, compressed_size = entry
+                with self._stats_lock:
+                    self.total_image_size += image_size
+                    self.total_compressed_size += compressed_size
+                    self.images_processed += 1
+                self.logger.debug(f"Embedding [{url}] (cached)")
+            elif url in self.non_embedded_resources:
+                # Already failed earlier in this document; don't download or compress it again
+                self.logger.debug(f"Not embedded earlier, skipping: {url}")
+                return match.original_text
+            else:
+                entry = self._encode_image(url, is_local_file)
+                if entry is None:
+                    return match.original_text
+                self._embed_cache[cache_key] = entry
+                mime_type, base64_data = entry[:2]
+                
+        # Preserve the original alt text and dimensions
+        alt_text = match.alt_text
+        dimensions = ""
+        
+        # Check for dimensions in alt text
+        pipe_pos = alt_text.find("|")
+        if pipe_pos != -1:
+            dimensions = alt_text[pipe_pos:]
+            alt_text = alt_text[:pipe_pos]
+            
+        # Create the embedded image markdown
+        embedded_image = f"![{alt_text}{dimensions}](data:{mime_type};base64,{base64_data})"
+        
+        # Handle clickable images
+        make_clickable = False
+        link_target = ""
+        
+        if not is_local_file:
+            make_clickable = True
+            link_target = url
+        elif match.alt_text.startswith(self.REMOTE_URL_PREFIXES):
+            make_clickable = True
+            link_target = match.alt_text
+            
+        if make_clickable:
+            # Clean up the link target
+            link_target = self.DIMENSION_PATTERN.sub("", link_target, count=1)
+                
+            # Create a clickable image; wrapping the markdown built above
+            # avoids formatting (and copying) the base64 payload a second time
+            return f"[{embedded_image}]({link_target})"
+        else:
+            return embedded_image
+
+    def _source_lock(self, cache_key: tuple) -> threading.Lock:
+        """
+        Get the lock serializing work on one image source.
+        
+        Args:
+            cache_key: The source's key in the embed cache
+            
+        Returns:
+            threading.Lock: The lock for that source
+        """
+        with self._stats_lock:
+            return self._source_locks.setdefault(cache_key, threading.Lock())
+
+    def _encode_image(self, url: str, is_local_file: bool) -> Optional[Tuple[str, str, int, int]]:
+        """
+        Load, compress and base64-encode one image.
+        
+        Args:
+            url: The resolved local path or remote URL
+            is_local_file: Whether url is a local path
+            
+        Returns:
+            tuple: (MIME type, base64 data, original size, compressed size), or
+                   None if the image is not embedded (it is then recorded in
+                   non_embedded_resources)
+        """
+        if is_local_file:
+            # Only the header is read here; compress_path decodes the file
+            # straight from disk, so the whole image is never copied into memory
             try:
+                image_size = os.path.getsize(url)
                 with open(url, "rb") as f:
-                    image_data = f.read()
+                    image_data = f.read(self.VIDEO_HEADER_SIZE)
             except Exception as e:
                 self.logger.error(f"Error reading local file: {url} - {e}")
                 self.non_embedded_resources.add(url)
-                return match.original_text
+                return None
         else:
             # Download from URL
             image_data = self.http_client.download_data(url)
             if not image_data:
                 self.logger.debug(f"Failed to download image: {url}")
                 self.non_embedded_resources.add(url)
-                return match.original_text
+                return None
+            image_size = len(image_data)
                 
         # Check if it's a video file
         if self.image_processor.is_video_file(image_data):
             self.logger.debug(f"Skipping video file: {url}")
             self.non_embedded_resources.add(url)
-            return match.original_text
+            return None
             
         # Get the MIME type
         mime_type = ImageProcessor.get_mime_type(url)
         if not mime_type:
             self.logger.debug(f"Unsupported file type: {url}")
             self.non_embedded_resources.add(url)
-            return match.original_text
+            return None
             
         # Update the total image size
-        self.total_image_size += len(image_data)
+        with self._stats_lock:
+            self.total_image_size += image_size
         
         # Compress the image
         try:
-            compressed_data = self.image_processor.compress_to_jpeg(image_data)
+            if is_local_file:
+                compressed_data = self.image_processor.compress_path(url)
+            else:
+                compressed_data = self.image_processor.compress_to_jpeg(image_data)
             if not compressed_data:
                 self.logger.debug(f"Image compression failed: {url}")
                 self.non_embedded_resources.add(url)
-                return match.original_text
+                return None
                 
             # Update the compressed size
-            self.total_compressed_size += len(compressed_data)
-            self.images_processed += 1
+            with self._stats_lock:
+                self.total_compressed_size += len(compressed_data)
+                self.images_processed += 1
             
-            # Log compression results
+            # Log compression results; the image processor's last_* values may
+            # already belong to another thread's image, so work from locals
             self.logger.debug(
-                f"Embedding [{url}](JPEG quality {self.image_processor.last_jpeg_quality}%): "
-                f"{self._format_file_size(self.image_processor.last_original_size)} -> "
-                f"{self._format_file_size(self.image_processor.last_compressed_size)}"
+                f"Embedding [{url}](JPEG quality "
+                f"{self.image_processor.calculate_jpeg_quality(image_size)}%): "
+                f"{self._format_file_size(image_size)} -> "
+                f"{self._format_file_size(len(compressed_data))}"
             )
             
             # Encode as base64
@@ -377,48 +537,14 @@ class MarkdownProcessor:
                     f"{self._format_file_size(self.max_file_size_bytes)}"
                 )
                 self.non_embedded_resources.add(url)
-                return match.original_text
+                return None
                 
-            # Preserve the original alt text and dimensions
-            alt_text = match.alt_text
-            dimensions = ""
-            
-            # Check for dimensions in alt text
-            pipe_pos = alt_text.find("|")
-            if pipe_pos != -1:
-                dimensions = alt_text[pipe_pos:]
-                alt_text = alt_text[:pipe_pos]
-                
-            # Create the embedded image markdown
-            embedded_image = f"![{alt_text}{dimensions}](data:{mime_type};base64,{base64_data})"
-            
-            # Handle clickable images
-            make_clickable = False
-            link_target = ""
-            
-            if not is_local_file and url.startswith(("http://", "https://")):
-                make_clickable = True
-                link_target = url
-            elif match.alt_text.startswith(("http://", "https://")):
-                make_clickable = True
-                link_target = match.alt_text
-                
-            if make_clickable:
-                # Clean up the link target
-                if "|" in link_target:
-                    link_target = link_target.split("|")[0]
-                if "\\|" in link_target:
-                    link_target = link_target.split("\\|")[0]
-                    
-                # Create a clickable image
-                return f"[![{alt_text}{dimensions}](data:{mime_type};base64,{base64_data})]({link_target})"
-            else:
-                return embedded_image
+            return mime_type, base64_data, image_size, len(compressed_data)
                 
         except Exception as e:
             self.logger.error(f"Error processing image: {url} - {e}")
             self.non_embedded_resources.add(url)
-            return match.original_text
+            return None
             
     @staticmethod
     def _format_file_size(size_bytes: int) -> str:
@@ -432,17 +558,18 @@ class MarkdownProcessor:
             str: The formatted file size
         """
         # Define units
-        units = ["B", "KB", "MB", "GB", "TB"]
+        units = ("B", "KB", "MB", "GB", "TB")
         
         # Handle zero size
         if size_bytes == 0:
             return "0 B"
             
-        # Calculate appropriate unit
+        # Calculate appropriate unit: each unit is 2**10 of the previous one,
+        # so the index falls out of the bit length without a division loop
         unit_index = 0
-        while size_bytes >= 1024 and unit_index < len(units) - 1:
-            size_bytes /= 1024.0
-            unit_index += 1
+        if size_bytes >= 1024:
+            unit_index = min((int(size_bytes).bit_length() - 1) // 10, len(units) - 1)
+            size_bytes /= 1 << (10 * unit_index)
             
         # Format with one decimal place
         return f"{size_bytes:.1f} {units[unit_index]}"
@@ -4,9 +4,18 @@ Utility functions for MarkdownImageEmbedder.
 
 import os
 import sys
-from typing import Optional, Union
+from typing import Iterable, Optional, Union
 
 
+# Write buffer for output files; the output alternates short markdown pieces
+# with multi-MB base64 images, so small pieces are batched into larger writes
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+VIDEO_EXTENSIONS = frozenset((
+    '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv',
+    '.mpeg', '.mpg', '.m4v', '.3gp', '.3g2', '.ogv', '.ts',
+))
+
 def format_file_size(size_bytes: int, decimals: int = 1) -> str:
     """
     Format a file size in human-readable form.
@@ -19,17 +28,18 @@ def format_file_size(size_bytes: int, decimals: int = 1) -> str:
         str: The formatted file size
     """
     # Define units
-    units = ["B", "KB", "MB", "GB", "TB"]
+    units = ("B", "KB", "MB", "GB", "TB")
     
     # Handle zero size
     if size_bytes == 0:
         return "0 B"
         
-    # Calculate appropriate unit
+    # Calculate appropriate unit: each unit is 2**10 of the previous one,
+    # so the index falls out of the bit length without a division loop
     unit_index = 0
-    while size_bytes >= 1024 and unit_index < len(units) - 1:
-        size_bytes /= 1024.0
-        unit_index += 1
+    if size_bytes >= 1024:
+        unit_index = min((int(size_bytes).bit_length() - 1) // 10, len(units) - 1)
+        size_bytes /= 1 << (10 * unit_index)
         
     # Format with specified decimal places
     return f"{size_bytes:.{decimals}f} {units[unit_index]}"
@@ -45,13 +55,8 @@ def is_video_file_by_extension(path: str) -> bool:
     Returns:
         bool: True if the file has a video extension, False otherwise
     """
-    video_extensions = {
-        '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv', 
-        '.mpeg', '.mpg', '.m4v', '.3gp', '.3g2', '.ogv', '.ts'
-    }
-    
     _, ext = os.path.splitext(path)
-    return ext.lower() in video_extensions
+    return ext.lower() in VIDEO_EXTENSIONS
 
 
 def get_temp_file_path(prefix: str = "mdie_", suffix: str = "") -> str:
@@ -95,22 +100,26 @@ def read_stdin_or_file(file_path: Optional[str] = None) -> str:
             raise RuntimeError(f"Error reading from stdin: {e}")
 
 
-def write_stdout_or_file(content: str, file_path: Optional[str] = None) -> None:
+def write_stdout_or_file(content: Union[str, Iterable[str]], file_path: Optional[str] = None) -> None:
     """
     Write content to stdout or a file.
     
     Args:
-        content: The content to write
+        content: The content to write, as one string or as pieces written in order
+            (e.g. MarkdownProcessor.iter_process)
         file_path: Path to a file (optional, uses stdout if None)
     """
+    chunks = [content] if isinstance(content, str) else content
     if file_path:
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            with open(file_path, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+                for chunk in chunks:
+                    f.write(chunk)
         except Exception as e:
             raise RuntimeError(f"Error writing to output file: {e}")
     else:
         try:
-            sys.stdout.write(content)
+            for chunk in chunks:
+                sys.stdout.write(chunk)
         except Exception as e:
             raise RuntimeError(f"Error writing to stdout: {e}")